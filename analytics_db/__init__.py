@@ -1,15 +1,65 @@
-from .adjust import AdjustRawDataConnector
-from .appsflyer import AppsflyerRawDataConnector
-from .predict import PredictDataConnector
-from .prepared_data import PreparedDataConnector
+from __future__ import annotations
 
-RawDataConnectorType = AppsflyerRawDataConnector | AdjustRawDataConnector
+import importlib
+import typing
+
+if typing.TYPE_CHECKING:
+    from .adjust import AdjustRawDataConnector  # noqa: F401
+    from .appsflyer import AppsflyerRawDataConnector  # noqa: F401
+    from .connection import ExecutionProfile, QueryCancelledError  # noqa: F401
+    from .normalization import InsertNormalizationError  # noqa: F401
+    from .predict import PredictDataConnector  # noqa: F401
+    from .prepared_data import PreparedDataConnector  # noqa: F401
+    from .raw_data import RawDataConnector, RawDataTableSpec  # noqa: F401
+
+    RawDataConnectorType = AppsflyerRawDataConnector | AdjustRawDataConnector
+
+# submodules pull in clickhouse_driver, so they are imported on first access only
+_lazy_attributes = {
+    "AdjustRawDataConnector": ".adjust",
+    "AppsflyerRawDataConnector": ".appsflyer",
+    "ExecutionProfile": ".connection",
+    "QueryCancelledError": ".connection",
+    "InsertNormalizationError": ".normalization",
+    "PredictDataConnector": ".predict",
+    "PreparedDataConnector": ".prepared_data",
+    "RawDataConnector": ".raw_data",
+    "RawDataTableSpec": ".raw_data",
+}
+
+__all__ = [
+    *_lazy_attributes,
+    "RawDataConnectorType",
+    "get_db_connector_for_tracker",
+    "get_prepared_data_db_connector",
+    "get_predict_db_connector",
+]
+
+
+def __getattr__(name: str):
+    if name == "RawDataConnectorType":
+        value = __getattr__("AppsflyerRawDataConnector") | __getattr__("AdjustRawDataConnector")
+    elif name in _lazy_attributes:
+        value = getattr(importlib.import_module(_lazy_attributes[name], __name__), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
 
 
 def get_db_connector_for_tracker(tracker: str) -> RawDataConnectorType:
     if tracker.lower() == "appsflyer":
+        from .appsflyer import AppsflyerRawDataConnector
+
         return AppsflyerRawDataConnector()
     elif tracker.lower() == "adjust":
+        from .adjust import AdjustRawDataConnector
+
         return AdjustRawDataConnector()
     else:
         raise NotImplementedError(
@@ -18,8 +68,12 @@ def get_db_connector_for_tracker(tracker: str) -> RawDataConnectorType:
 
 
 def get_prepared_data_db_connector(pipeline_id: str) -> PreparedDataConnector:
+    from .prepared_data import PreparedDataConnector
+
     return PreparedDataConnector(pipeline_id=pipeline_id)
 
 
 def get_predict_db_connector(is_event_predict=False, is_metric_predict=False, is_sent_event=False) -> PredictDataConnector:
+    from .predict import PredictDataConnector
+
     return PredictDataConnector(is_event_predict, is_metric_predict, is_sent_event)
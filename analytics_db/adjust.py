@@ -1,3 +1,51 @@
-class AdjustRawDataConnector:
-    # TODO: implement
-    pass
+from .raw_data import RawDataConnector, RawDataTableSpec
+
+# most queries filter by app and install time range and then group by user,
+# so the sorting key follows the same order and reads stay local to a few granules
+ADJUST_CREATE_TABLE_QUERY = """
+CREATE TABLE IF NOT EXISTS raw_data.adjust_raw_data (
+    app_id LowCardinality(String),
+    adid String,
+    activity_kind LowCardinality(String),
+    event_name LowCardinality(String),
+    event_token LowCardinality(String),
+    installed_at DateTime,
+    created_at DateTime,
+    revenue Nullable(Float64),
+    currency LowCardinality(Nullable(String)),
+    tracker String,
+    tracker_name String,
+    network_name LowCardinality(String),
+    campaign_name String,
+    adgroup_name String,
+    creative_name String,
+    store LowCardinality(String),
+    country LowCardinality(String),
+    language LowCardinality(String),
+    os_name LowCardinality(String),
+    os_version LowCardinality(String),
+    device_type LowCardinality(String),
+    device_name LowCardinality(String),
+    idfa String,
+    idfv String,
+    gps_adid String,
+    environment LowCardinality(String),
+    inserted_at DateTime DEFAULT now()
+) ENGINE = MergeTree()
+PARTITION BY toYYYYMM(installed_at)
+ORDER BY (app_id, toDate(installed_at), adid, created_at)
+"""
+
+ADJUST_TABLE_SPEC = RawDataTableSpec(
+    table_name="raw_data.adjust_raw_data",
+    user_id_column="adid",
+    install_time_column="installed_at",
+    event_time_column="created_at",
+    event_name_column="event_name",
+    revenue_expression="ifNull(revenue, 0)",
+    create_table_query=ADJUST_CREATE_TABLE_QUERY,
+)
+
+
+class AdjustRawDataConnector(RawDataConnector):
+    spec = ADJUST_TABLE_SPEC
@@ -0,0 +1,9 @@
+import re
+
+
+def unwrap_column_type(column_type: str) -> tuple[str, bool]:
+    column_type = re.sub(r"^LowCardinality\((.*)\)$", r"\1", column_type)
+    match = re.match(r"^Nullable\((.*)\)$", column_type)
+    if match:
+        return match.group(1), True
+    return column_type, False
@@ -5,3 +5,20 @@ DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
 DB_NAME = os.getenv("DB_NAME", "analytics_db")
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = int(os.getenv("DB_PORT", "8123"))
+
+# limits applied to heavy analytical reads, 0 means no limit
+DB_HEAVY_QUERY_MAX_MEMORY_USAGE = int(os.getenv("DB_HEAVY_QUERY_MAX_MEMORY_USAGE", "0"))
+DB_HEAVY_QUERY_MAX_EXECUTION_TIME = int(os.getenv("DB_HEAVY_QUERY_MAX_EXECUTION_TIME", "0"))
+# external GROUP BY/sort threshold, 0 means half of DB_HEAVY_QUERY_MAX_MEMORY_USAGE or 8 GiB when there is no limit
+DB_EXTERNAL_SPILL_BYTES = int(os.getenv("DB_EXTERNAL_SPILL_BYTES", "0"))
+
+# comma separated host[:port] list of cluster replicas, DB_HOST/DB_PORT are used when empty
+DB_HOSTS = os.getenv("DB_HOSTS", "")
+# round_robin or least_loaded
+DB_READ_ROUTING = os.getenv("DB_READ_ROUTING", "round_robin")
+# seconds, 0 means a short timeout with several DB_HOSTS, so a dead replica fails over quickly, and 300 otherwise,
+# writes always wait 300 seconds for a response by default
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "0"))
+DB_SEND_RECEIVE_TIMEOUT = int(os.getenv("DB_SEND_RECEIVE_TIMEOUT", "0"))
+# cluster name from system.clusters, needed to fan out queries over shards
+DB_CLUSTER = os.getenv("DB_CLUSTER", "")
@@ -1,25 +1,259 @@
-from clickhouse_driver import Client
+import functools
+import logging
+import time
+import types
+from dataclasses import dataclass, fields
 
-from .config import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
+import clickhouse_driver
+from clickhouse_driver.errors import NetworkError, SocketTimeoutError
 
+from .config import (
+    DB_CLUSTER,
+    DB_CONNECT_TIMEOUT,
+    DB_EXTERNAL_SPILL_BYTES,
+    DB_HEAVY_QUERY_MAX_EXECUTION_TIME,
+    DB_HEAVY_QUERY_MAX_MEMORY_USAGE,
+    DB_HOST,
+    DB_HOSTS,
+    DB_NAME,
+    DB_PASSWORD,
+    DB_PORT,
+    DB_READ_ROUTING,
+    DB_SEND_RECEIVE_TIMEOUT,
+    DB_USER,
+)
+from .routing import HostPool, HostState, parse_hosts
 
-def add_db_client(func):
+NETWORK_ERRORS = (NetworkError, SocketTimeoutError, EOFError)
+
+
+class QueryCancelledError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ExecutionProfile:
+    # server side limits, passed to Clickhouse as query settings
+    max_memory_usage: int = None
+    max_execution_time: int = None
+    max_bytes_to_read: int = None
+    max_threads: int = None
+    max_bytes_before_external_group_by: int = None
+    max_bytes_before_external_sort: int = None
+    # client side limits, checked on every progress packet
+    cancel_after_seconds: float = None
+    cancel_after_rows_to_read: int = None
+
+    def to_settings(self) -> dict:
+        return {
+            x.name: getattr(self, x.name)
+            for x in fields(self)
+            if not x.name.startswith("cancel_") and getattr(self, x.name) is not None
+        }
+
+    @property
+    def has_client_side_limits(self) -> bool:
+        return self.cancel_after_seconds is not None or self.cancel_after_rows_to_read is not None
+
+
+def get_external_spill_bytes(max_memory_usage: int = None) -> int:
+    if DB_EXTERNAL_SPILL_BYTES:
+        return DB_EXTERNAL_SPILL_BYTES
+    # Clickhouse recommends spilling at about half of the memory limit, otherwise the query fails before spilling
+    if max_memory_usage:
+        return max_memory_usage // 2
+    return 8 * 1024**3
+
+
+HEAVY_READ_PROFILE = ExecutionProfile(
+    max_memory_usage=DB_HEAVY_QUERY_MAX_MEMORY_USAGE or None,
+    max_execution_time=DB_HEAVY_QUERY_MAX_EXECUTION_TIME or None,
+    max_bytes_before_external_group_by=get_external_spill_bytes(DB_HEAVY_QUERY_MAX_MEMORY_USAGE),
+    max_bytes_before_external_sort=get_external_spill_bytes(DB_HEAVY_QUERY_MAX_MEMORY_USAGE),
+)
+
+
+class Client(clickhouse_driver.Client):
+    execution_profile: ExecutionProfile = None
+
+    def execute(
+        self,
+        query,
+        params=None,
+        with_column_types=False,
+        external_tables=None,
+        query_id=None,
+        settings=None,
+        types_check=False,
+        columnar=False,
+    ):
+        # query_dataframe goes through execute too, so every read gets client side limits
+        is_insert = isinstance(params, (list, tuple, types.GeneratorType))
+        if self.execution_profile is None or not self.execution_profile.has_client_side_limits or is_insert:
+            return super().execute(
+                query,
+                params=params,
+                with_column_types=with_column_types,
+                external_tables=external_tables,
+                query_id=query_id,
+                settings=settings,
+                types_check=types_check,
+                columnar=columnar,
+            )
+
+        profile = self.execution_profile
+        started_at = time.monotonic()
+        progress = self.execute_with_progress(
+            query,
+            params,
+            with_column_types=with_column_types,
+            external_tables=external_tables,
+            query_id=query_id,
+            settings=settings,
+            types_check=types_check,
+            columnar=columnar,
+        )
+        for rows_read, total_rows in progress:
+            # total_rows is the server estimate, so oversized reads are cancelled before they are done
+            rows_to_read = max(rows_read, total_rows)
+            if profile.cancel_after_rows_to_read is not None and rows_to_read > profile.cancel_after_rows_to_read:
+                self.cancel()
+                raise QueryCancelledError(
+                    f"query cancelled: rows_read={rows_read}, total_rows={total_rows} "
+                    f"exceed cancel_after_rows_to_read={profile.cancel_after_rows_to_read}"
+                )
+            elapsed = time.monotonic() - started_at
+            if profile.cancel_after_seconds is not None and elapsed > profile.cancel_after_seconds:
+                self.cancel()
+                raise QueryCancelledError(
+                    f"query cancelled: running longer than cancel_after_seconds={profile.cancel_after_seconds}"
+                )
+
+        return progress.get_result()
+
+    def iter_column_blocks(self, query, params=None, settings=None):
+        # unlike execute_iter, server blocks are not transposed into rows, with use_numpy every column is an array
+        with self.disconnect_on_error(query, settings):
+            if params is not None:
+                query = self.substitute_params(query, params, self.connection.context)
+            self.connection.send_query(query)
+            self.connection.send_external_tables(None)
+
+        for packet in self.packet_generator():
+            block = getattr(packet, "block", None)
+            if block is not None:
+                yield block.columns_with_types, block.get_columns()
+
+
+def _apply_execution_profile(client: clickhouse_driver.Client, profile: ExecutionProfile):
+    previous = client.settings, getattr(client, "execution_profile", None)
+    client.settings = {**client.settings, **profile.to_settings()}
+    if isinstance(client, Client):
+        client.execution_profile = profile
+    return previous
+
+
+def _restore_execution_profile(client: clickhouse_driver.Client, previous):
+    client.settings, profile = previous
+    if isinstance(client, Client):
+        client.execution_profile = profile
+
+
+_host_pool = None
+
+
+def get_host_pool() -> HostPool:
+    global _host_pool
+    if _host_pool is None:
+        hosts = parse_hosts(DB_HOSTS, DB_PORT) or [(DB_HOST, DB_PORT)]
+        _host_pool = HostPool(hosts, read_routing=DB_READ_ROUTING)
+    return _host_pool
+
+
+def _create_client(host: HostState, use_numpy: bool, profile: ExecutionProfile, write: bool = False) -> Client:
+    # a replica that silently drops packets should not block a read that could go to another one for minutes,
+    # writes keep the long timeout as OPTIMIZE FINAL and other DDL send nothing back until they are done
+    has_failover = len(get_host_pool().hosts) > 1
+    client = Client(
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=host.host,
+        port=host.port,
+        database=DB_NAME,
+        compression='zstd',
+        secure=True if host.port == 9440 else False,
+        settings={"use_numpy": use_numpy, **(profile.to_settings() if profile else {})},
+        connect_timeout=DB_CONNECT_TIMEOUT or (10 if has_failover else 60*5),
+        send_receive_timeout=DB_SEND_RECEIVE_TIMEOUT or (60 if has_failover and not write else 60*5),
+    )
+    client.execution_profile = profile
+    return client
+
+
+def add_db_client(func=None, *, use_numpy: bool = True, write: bool = False):
+    # scalar queries use plain Python values, so they don't need numpy/pandas to be imported at all
+    if func is None:
+        return functools.partial(add_db_client, use_numpy=use_numpy, write=write)
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
+        profile = kwargs.pop("execution_profile", None)
+        if profile is None and len(args) > 0:
+            profile = getattr(args[0], "execution_profiles", {}).get(func.__name__)
+
         if kwargs.get("db_client") is not None:
-            return func(*args, **kwargs)
-        else:
-            with Client(
-                user=DB_USER,
-                password=DB_PASSWORD,
-                host=DB_HOST,
-                port=DB_PORT,
-                database=DB_NAME,
-                compression='zstd',
-                secure=True if DB_PORT == 9440 else False,
-                settings={"use_numpy": True},
-                connect_timeout=60*5,
-            ) as client:
-                kwargs["db_client"] = client
+            client = kwargs["db_client"]
+            if profile is None:
+                return func(*args, **kwargs)
+
+            previous = _apply_execution_profile(client, profile)
+            try:
                 return func(*args, **kwargs)
+            finally:
+                _restore_execution_profile(client, previous)
+
+        host_pool = get_host_pool()
+        hosts = host_pool.choose_hosts(write=write)
+        for i, host in enumerate(hosts):
+            is_connected = False
+            client = _create_client(host, use_numpy, profile, write=write)
+            try:
+                with host_pool.acquire(host):
+                    client.connection.force_connect()
+                    is_connected = True
+                    kwargs["db_client"] = client
+                    result = func(*args, **kwargs)
+            except NETWORK_ERRORS as e:
+                # the driver disconnects on network errors, so a still connected client means the error came from
+                # a nested call with its own connection, which says nothing about this host
+                if is_connected and client.connection.connected:
+                    raise e
+                host_pool.mark_failure(host)
+                # a write could have been partially applied, so only reads are retried after the query was sent
+                if i == len(hosts) - 1 or (is_connected and write):
+                    raise e
+                logging.warning(f"Clickhouse host {host.host}:{host.port} is unavailable, trying next one: {e}")
+            else:
+                host_pool.mark_success(host)
+                return result
+            finally:
+                client.disconnect()
 
     return wrapper
+
+
+@add_db_client(use_numpy=False)
+def get_shard_numbers(cluster: str = DB_CLUSTER, db_client: Client = None) -> list[int]:
+    if not cluster:
+        raise ValueError("cluster should be provided, set DB_CLUSTER")
+
+    query = """
+    SELECT DISTINCT shard_num
+    FROM system.clusters
+    WHERE cluster = %(cluster)s
+    ORDER BY shard_num
+    """
+    shard_numbers = [x[0] for x in db_client.execute(query, {"cluster": cluster})]
+    if not shard_numbers:
+        raise ValueError(f"cluster {cluster} has no shards in system.clusters, check DB_CLUSTER")
+    return shard_numbers
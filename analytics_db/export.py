@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import re
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .connection import Client, add_db_client
+from .column_types import unwrap_column_type
+
+MANIFEST_FILE_NAME = "_manifest.json"
+
+_ARROW_TYPES = {
+    "Int8": pa.int8(),
+    "Int16": pa.int16(),
+    "Int32": pa.int32(),
+    "Int64": pa.int64(),
+    "UInt8": pa.uint8(),
+    "UInt16": pa.uint16(),
+    "UInt32": pa.uint32(),
+    "UInt64": pa.uint64(),
+    "Float32": pa.float32(),
+    "Float64": pa.float64(),
+    "Bool": pa.bool_(),
+    "String": pa.string(),
+    "UUID": pa.string(),
+    "Date": pa.date32(),
+    "Date32": pa.date32(),
+}
+
+
+def _arrow_type(column_type: str) -> pa.DataType:
+    base_type, _ = unwrap_column_type(column_type)
+
+    if base_type in _ARROW_TYPES:
+        return _ARROW_TYPES[base_type]
+    if base_type == "DateTime" or base_type.startswith("DateTime("):
+        return pa.timestamp("s")
+    if base_type.startswith("DateTime64"):
+        precision = int(re.match(r"DateTime64\((\d+)", base_type).group(1))
+        return pa.timestamp("ms" if precision <= 3 else "us" if precision <= 6 else "ns")
+    if base_type.startswith("Array("):
+        return pa.list_(_arrow_type(base_type[len("Array("):-1]))
+    # FixedString, Enum, Decimal and everything else is exported as text
+    return pa.string()
+
+
+class ExportManifest:
+    def __init__(self, output_dir: str, description: dict):
+        self.path = os.path.join(output_dir, MANIFEST_FILE_NAME)
+        self.lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.data = json.load(f)
+            if self.data["description"] != description:
+                raise ValueError(
+                    f"{output_dir} already contains a different export: {self.data['description']}, "
+                    f"remove it or use another output_dir"
+                )
+        else:
+            os.makedirs(output_dir, exist_ok=True)
+            self.data = {"description": description, "partitions": {}}
+            self._save()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def is_done(self, partition_key: str) -> bool:
+        return partition_key in self.data["partitions"]
+
+    def mark_done(self, partition_key: str, number_of_rows: int):
+        with self.lock:
+            self.data["partitions"][partition_key] = number_of_rows
+            self._save()
+
+
+@add_db_client(use_numpy=False)
+def _get_partitions(
+    table: str,
+    partition_expressions: dict[str, str],
+    where_parts: list[str],
+    where_args: dict,
+    db_client: Client = None,
+) -> list[dict]:
+    names = list(partition_expressions)
+    query = f"""
+    SELECT {', '.join([f'{expression} as {name}' for name, expression in partition_expressions.items()])}
+    FROM {table}
+    {('WHERE ' + ' AND '.join(where_parts)) if len(where_parts) > 0 else ''}
+    GROUP BY {', '.join(names)}
+    ORDER BY {', '.join(names)}
+    """
+    return [dict(zip(names, x)) for x in db_client.execute(query, where_args)]
+
+
+@add_db_client
+def _export_partition(
+    table: str,
+    partition: dict,
+    partition_expressions: dict[str, str],
+    where_parts: list[str],
+    where_args: dict,
+    path: str,
+    block_size: int,
+    db_client: Client = None,
+) -> int:
+    # NULL never equals anything, so rows with a NULL partition value need isNull to be exported at all
+    where_parts = where_parts + [
+        f"isNull({partition_expressions[x]})" if value is None else f"{partition_expressions[x]} = %(partition_{x})s"
+        for x, value in partition.items()
+    ]
+    where_args = {**where_args, **{f"partition_{x}": value for x, value in partition.items() if value is not None}}
+    query = f"""
+    SELECT *
+    FROM {table}
+    WHERE {' AND '.join(where_parts)}
+    """
+
+    blocks = db_client.iter_column_blocks(query, where_args, settings={"max_block_size": block_size})
+    # the first block is an empty header carrying column names and types
+    columns_with_types, _ = next(blocks, (None, None))
+    if columns_with_types is None:
+        return 0
+
+    schema = pa.schema([(name, _arrow_type(column_type)) for name, column_type in columns_with_types])
+    text_columns = [
+        i for i, (_, column_type) in enumerate(columns_with_types)
+        if schema.field(i).type == pa.string() and unwrap_column_type(column_type)[0] != "String"
+    ]
+
+    def to_record_batch(columns: list) -> pa.RecordBatch:
+        arrays = []
+        for i, values in enumerate(columns):
+            if i in text_columns:
+                values = [None if x is None else str(x) for x in values]
+            # numpy blocks are converted without going through Python objects
+            arrays.append(pa.array(values, from_pandas=True).cast(schema.field(i).type, safe=False))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    number_of_rows = 0
+    # only one block is kept in memory, every block becomes a row group
+    with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+        for _, columns in blocks:
+            if len(columns) == 0 or len(columns[0]) == 0:
+                continue
+            writer.write_batch(to_record_batch(columns))
+            number_of_rows += len(columns[0])
+
+    os.replace(tmp_path, path)
+    return number_of_rows
+
+
+def export_table_to_parquet(
+    table: str,
+    output_dir: str,
+    partition_expressions: dict[str, str],
+    where_parts: list[str] = None,
+    where_args: dict = None,
+    max_workers: int = 4,
+    block_size: int = 100_000,
+) -> dict[str, int]:
+    where_parts, where_args = where_parts or [], where_args or {}
+    manifest = ExportManifest(
+        output_dir,
+        {
+            "table": table,
+            "partition_expressions": partition_expressions,
+            "where_parts": where_parts,
+            "where_args": {x: str(value) for x, value in where_args.items()},
+        },
+    )
+
+    partitions = _get_partitions(table, partition_expressions, where_parts, where_args)
+    partitions_to_export = {}
+    for partition in partitions:
+        # values are escaped, so an app_id like "../x" can't leave output_dir or add directory levels
+        partition_key = "/".join([f"{x}={urllib.parse.quote(str(value), safe='')}" for x, value in partition.items()])
+        if manifest.is_done(partition_key):
+            continue
+        partitions_to_export[partition_key] = partition
+
+    logging.info(
+        f"Exporting {table} to {output_dir}: {len(partitions_to_export)} of {len(partitions)} partitions left"
+    )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                _export_partition,
+                table,
+                partition,
+                partition_expressions,
+                where_parts,
+                where_args,
+                os.path.join(output_dir, partition_key, "part-0.parquet"),
+                block_size,
+            ): partition_key
+            for partition_key, partition in partitions_to_export.items()
+        }
+        # every finished partition is recorded before the first error is raised, so a resume doesn't redo them
+        error = None
+        for future in as_completed(futures):
+            try:
+                manifest.mark_done(futures[future], future.result())
+            except Exception as e:
+                logging.error(f"Failed to export partition {futures[future]} of {table}: {e}")
+                error = error or e
+        if error is not None:
+            raise error
+
+    return manifest.data["partitions"]
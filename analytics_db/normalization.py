@@ -0,0 +1,146 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from .column_types import unwrap_column_type
+from .connection import Client
+
+_column_types_cache: dict[str, dict[str, str]] = {}
+_server_timezone_cache: dict[str, str] = {}
+
+_INT_DTYPES = {
+    "Int8": np.int8,
+    "Int16": np.int16,
+    "Int32": np.int32,
+    "Int64": np.int64,
+    "UInt8": np.uint8,
+    "UInt16": np.uint16,
+    "UInt32": np.uint32,
+    "UInt64": np.uint64,
+    "Bool": np.bool_,
+}
+_FLOAT_DTYPES = {
+    "Float32": np.float32,
+    "Float64": np.float64,
+}
+
+
+class InsertNormalizationError(ValueError):
+    def __init__(self, table: str, problems: list[str]):
+        self.table = table
+        self.problems = problems
+        super().__init__(f"DataFrame can't be inserted into {table}: {'; '.join(problems)}")
+
+
+def _split_table_name(table: str) -> tuple[str, str]:
+    database, name = table.split(".", 1)
+    return database.strip("`"), name.strip("`")
+
+
+def get_column_types(table: str, client: Client, refresh: bool = False) -> dict[str, str]:
+    if refresh or table not in _column_types_cache:
+        database, name = _split_table_name(table)
+        rows = client.execute(
+            "SELECT name, type FROM system.columns WHERE database = %(database)s AND table = %(table)s",
+            {"database": database, "table": name},
+        )
+        _column_types_cache[table] = dict(rows)
+    return _column_types_cache[table]
+
+
+def get_server_timezone(client: Client) -> str:
+    if "timezone" not in _server_timezone_cache:
+        _server_timezone_cache["timezone"] = client.execute("SELECT timezone()")[0][0]
+    return _server_timezone_cache["timezone"]
+
+
+def clear_column_types_cache():
+    _column_types_cache.clear()
+    _server_timezone_cache.clear()
+
+
+def _normalize_column(values: pd.Series, column_type: str, problems: list[str], client: Client) -> pd.Series:
+    base_type, nullable = unwrap_column_type(column_type)
+    original = values
+    was_null = values.isna()
+
+    number_of_problems = len(problems)
+
+    if base_type in _INT_DTYPES or base_type in _FLOAT_DTYPES:
+        if not pd.api.types.is_numeric_dtype(values.dtype):
+            # nullable dtypes keep integers exact, float64 would round ids above 2**53
+            values = pd.to_numeric(values, errors="coerce", dtype_backend="numpy_nullable")
+        failed = values.isna() & ~was_null
+        if failed.any():
+            problems.append(
+                f"column {values.name} ({column_type}): {failed.sum()} values are not numeric, "
+                f"e.g. {original[failed].iloc[0]!r}"
+            )
+        if base_type in _INT_DTYPES and base_type != "Bool":
+            # astype wraps values around, 300 would be written to UInt8 as 44
+            info = np.iinfo(_INT_DTYPES[base_type])
+            failed = (values.notna() & ((values < info.min) | (values > info.max) | (values % 1 != 0))).fillna(False)
+            if failed.any():
+                problems.append(
+                    f"column {values.name} ({column_type}): {failed.sum()} values don't fit {base_type}, "
+                    f"e.g. {original[failed].iloc[0]!r}"
+                )
+
+        if len(problems) > number_of_problems:
+            # the insert is rejected anyway, so the values are not cast
+            return values
+
+        if base_type in _FLOAT_DTYPES:
+            values = pd.Series(
+                values.to_numpy(dtype=_FLOAT_DTYPES[base_type], na_value=np.nan), index=values.index, name=values.name
+            )
+        elif not values.isna().any():
+            values = pd.Series(values.to_numpy(dtype=_INT_DTYPES[base_type]), index=values.index, name=values.name)
+        else:
+            # Python ints in an object array stay exact, the driver writes the column null value in place of None
+            values = values.astype(object).where(values.notna(), None)
+    elif base_type.startswith("DateTime") or base_type == "Date" or base_type == "Date32":
+        # epoch values are written by the driver as they are, to_datetime would read them as nanoseconds
+        if not pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_datetime64_any_dtype(values.dtype):
+            values = pd.to_datetime(values, errors="coerce", format="mixed")
+            if values.dtype == object:
+                # strings with different UTC offsets can only be parsed as UTC
+                values = pd.to_datetime(values, errors="coerce", format="mixed", utc=True)
+        if pd.api.types.is_datetime64_any_dtype(values.dtype) and values.dt.tz is not None:
+            # naive values are written as wall time of the column timezone, or of the server when it has none
+            match = re.search(r"'([^']+)'", base_type)
+            timezone = match.group(1) if match else get_server_timezone(client)
+            values = values.dt.tz_convert(timezone).dt.tz_localize(None)
+        failed = values.isna() & ~was_null
+        if failed.any():
+            problems.append(
+                f"column {values.name} ({column_type}): {failed.sum()} values are not dates, "
+                f"e.g. {original[failed].iloc[0]!r}"
+            )
+    elif base_type == "String" or base_type.startswith("FixedString"):
+        if pd.api.types.infer_dtype(values, skipna=True) not in ("string", "empty"):
+            values = values.where(was_null, values.astype(str))
+        values = values.astype(object).where(~was_null, None)
+
+    if not nullable and values.isna().any():
+        problems.append(f"column {values.name} ({column_type}): {values.isna().sum()} null values")
+
+    return values
+
+
+def normalize_dataframe_for_insert(table: str, df: pd.DataFrame, client: Client) -> pd.DataFrame:
+    column_types = get_column_types(table, client)
+    if any(x not in column_types for x in df.columns):
+        # the table might have been altered since we cached it
+        column_types = get_column_types(table, client, refresh=True)
+
+    problems = [f"column {x} is not present in the table" for x in df.columns if x not in column_types]
+    normalized = {
+        x: _normalize_column(df[x], column_types[x], problems, client) for x in df.columns if x in column_types
+    }
+
+    if problems:
+        raise InsertNormalizationError(table, problems)
+
+    return pd.DataFrame(normalized, index=df.index)
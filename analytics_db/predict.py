@@ -1,25 +1,151 @@
+from __future__ import annotations
+
 from datetime import date, datetime
+import typing
 import uuid
-import pandas as pd
 
-from .connection import Client, add_db_client
+from .connection import HEAVY_READ_PROFILE, Client, add_db_client
+
+if typing.TYPE_CHECKING:
+    import pandas as pd
+
+    from .raw_data import RawDataConnector
 
 class PredictDataConnector:
     def __init__(self, is_event_predict: bool = False, is_metric_predict: bool = False, is_sent_event: bool = False):
+        self.predict_id_column = None
         if is_event_predict:
             self.table_path = f"predict.event_predict"
+            self.predict_id_column = "event_id"
         elif is_metric_predict:
             self.table_path = f"predict.metric_predict"
+            self.predict_id_column = "metric_id"
         elif is_sent_event:
             self.table_path = f"predict.sent_event"
         else:
             raise NotImplementedError("either is_event_predict or is_metric_predict or is_sent_event should be True")
 
-    @add_db_client
+        self.execution_profiles = {
+            "evaluate_predicts": HEAVY_READ_PROFILE,
+        }
+
+    @add_db_client(write=True)
     def save_predicts(self, predicts: pd.DataFrame, db_client: Client = None):
+        from .normalization import normalize_dataframe_for_insert
+
+        predicts = normalize_dataframe_for_insert(self.table_path, predicts, db_client)
         columns_str = ", ".join(predicts.columns)
 
         db_client.insert_dataframe(
             f"""INSERT INTO {self.table_path} ({columns_str}) VALUES""", 
             predicts
         )
+
+    def _create_query_to_join_predicts_with_target(
+        self,
+        raw_data_connector: RawDataConnector,
+        application_id: str,
+        target_type: typing.Literal['ltv', 'number_of_conversions', 'lt'],
+        target_calculation_period_in_seconds: int,
+        convertion_event_names: list[str] = None,
+        start_dt: datetime = None,
+        end_dt: datetime = None,
+        predict_id: uuid.UUID = None,
+        predict_column: str = "predict",
+    ) -> tuple[str, dict]:
+        if self.predict_id_column is None:
+            raise ValueError(f"predicts from {self.table_path} can't be evaluated")
+        if predict_id is None:
+            # predicts of different events/metrics would be mixed per user and scored against one target
+            raise ValueError(
+                f"predict_id should be provided, {self.table_path} mixes predicts of many {self.predict_id_column}s"
+            )
+
+        install_time_column = raw_data_connector.install_time_column
+        target_query, where_args = raw_data_connector.create_query_to_calculate_target(
+            application_id,
+            target_type,
+            target_calculation_period_in_seconds,
+            convertion_event_names,
+            start_dt,
+            end_dt,
+            add_fields_to_take_first=[install_time_column],
+        )
+
+        where_args["predict_id"] = str(predict_id)
+
+        # a user could be predicted several times, the latest predict is the one we act on
+        query = f"""
+        SELECT t.user_mmp_id as user_mmp_id, toDate(t.{install_time_column}_fv) as install_date,
+            p.prediction as prediction, toFloat64(t.target) as target
+        FROM (
+            SELECT user_mmp_id, argMax({predict_column}, created_at) as prediction
+            FROM {self.table_path}
+            WHERE {self.predict_id_column} = %(predict_id)s
+            GROUP BY user_mmp_id
+        ) as p
+        INNER JOIN ({target_query}) as t ON p.user_mmp_id = t.user_mmp_id
+        """
+
+        return query, where_args
+
+    @add_db_client
+    def evaluate_predicts(
+        self,
+        raw_data_connector: RawDataConnector,
+        application_id: str,
+        target_type: typing.Literal['ltv', 'number_of_conversions', 'lt'],
+        target_calculation_period_in_seconds: int,
+        convertion_event_names: list[str] = None,
+        start_dt: datetime = None,
+        end_dt: datetime = None,
+        predict_id: uuid.UUID = None,
+        predict_column: str = "predict",
+        number_of_calibration_buckets: int = 10,
+        positive_target_threshold: float = 0,
+        db_client: Client = None,
+    ) -> dict[str, pd.DataFrame]:
+        joined_query, where_args = self._create_query_to_join_predicts_with_target(
+            raw_data_connector,
+            application_id,
+            target_type,
+            target_calculation_period_in_seconds,
+            convertion_event_names,
+            start_dt,
+            end_dt,
+            predict_id,
+            predict_column,
+        )
+        where_args["positive_target_threshold"] = positive_target_threshold
+        where_args["number_of_calibration_buckets"] = number_of_calibration_buckets
+
+        # joined predicts and targets are computed once, every result is a grouping set over the same rows
+        query = f"""
+        SELECT grouping(install_date, bucket) as grouping_id, install_date, bucket,
+            count(1) as number_of_users,
+            avg(abs(prediction - target)) as mae,
+            sqrt(avg(pow(prediction - target, 2))) as rmse,
+            min(prediction) as min_prediction,
+            max(prediction) as max_prediction,
+            avg(prediction) as avg_prediction,
+            avg(target) as avg_target,
+            arrayAUC(groupArray(prediction), groupArray(is_positive)) as roc_auc
+        FROM (
+            SELECT install_date, prediction, target, target > %(positive_target_threshold)s as is_positive,
+                intDiv((row_number() OVER (ORDER BY prediction) - 1) * %(number_of_calibration_buckets)s,
+                    count(1) OVER ()) as bucket
+            FROM ({joined_query})
+        )
+        GROUP BY GROUPING SETS ((), (install_date), (bucket))
+        ORDER BY grouping_id, install_date, bucket
+        """
+        # with standard grouping() a bit is set when the column is not a part of the grouping set
+        df = db_client.query_dataframe(query, where_args, settings={"force_grouping_standard_compatibility": 1})
+
+        metrics = ["number_of_users", "mae", "rmse", "avg_prediction", "avg_target", "roc_auc"]
+        calibration_metrics = ["number_of_users", "min_prediction", "max_prediction", "avg_prediction", "avg_target"]
+        return {
+            "overall": df[df["grouping_id"] == 3][metrics].reset_index(drop=True),
+            "by_install_date": df[df["grouping_id"] == 1].set_index("install_date")[metrics],
+            "calibration": df[df["grouping_id"] == 2].set_index("bucket")[calibration_metrics],
+        }
@@ -1,12 +1,18 @@
+from __future__ import annotations
+
 import logging
+import os
+import typing
 import uuid
-from datetime import datetime
-
-import pandas as pd
+from datetime import date, datetime
 
-from .connection import Client, add_db_client
+from .connection import HEAVY_READ_PROFILE, Client, add_db_client
 from clickhouse_driver.errors import ServerException
 
+if typing.TYPE_CHECKING:
+    import pandas as pd
+
+DedupMode = typing.Literal["final", "argmax"]
 
 
 class PreparedDataConnector:
@@ -14,8 +20,13 @@ class PreparedDataConnector:
         self.pipeline_id = pipeline_id
         self.table_uservectors = f"prepared_data.`{self.pipeline_id}_uservectors`"
         self.table_eventvectors = f"prepared_data.`{self.pipeline_id}_eventvectors`"
+        self.key_columns_uservectors = ("user_mmp_id",)
+        self.key_columns_eventvectors = ("user_mmp_id", "event_number")
+        self.execution_profiles = {
+            "get_prepated_data": HEAVY_READ_PROFILE,
+        }
 
-    @add_db_client
+    @add_db_client(write=True)
     def init_db(self, db_client: Client = None):
         db_client.execute(
             f"""
@@ -40,11 +51,68 @@ class PreparedDataConnector:
                     logging.exception(e)
                 self._insert_df_in_chunks_if_needed(query, df.iloc[i:], client, chunk_size=chunk_size // 2)
 
-    @add_db_client
+    def _create_dedup_select_query(
+        self, table: str, key_columns: tuple[str, ...], where_parts: list[str], dedup: DedupMode | None, client: Client
+    ) -> str:
+        where_str = ('WHERE ' + ' AND '.join(where_parts)) if len(where_parts) > 0 else ''
+
+        if dedup is None:
+            return f"""
+            SELECT *
+            FROM {table}
+            {where_str}
+            """
+        elif dedup == "final":
+            return f"""
+            SELECT *
+            FROM {table} FINAL
+            {where_str}
+            """
+        elif dedup == "argmax":
+            # ReplacingMergeTree without version column keeps the last inserted row,
+            # created_at is the closest thing to insertion order we have. The whole row is picked at once,
+            # rows inserted within the same second tie and are resolved arbitrarily (but consistently) by row hash.
+            # Like FINAL, the filter applies to the picked row, so a key whose latest version is out of range is
+            # skipped instead of returning a stale version, the inner IN only limits the keys to aggregate
+            columns = [x[0] for x in client.execute(f"DESCRIBE TABLE {table}")]
+            value_columns = [x for x in columns if x not in key_columns]
+            key_columns_str = ', '.join([f'`{x}`' for x in key_columns])
+            row_str = ', '.join([f'`{x}`' for x in value_columns])
+            columns_str = ', '.join(
+                [f'`{x}`' if x in key_columns else f'tupleElement(_row, {value_columns.index(x) + 1}) as `{x}`'
+                 for x in columns]
+            )
+            return f"""
+            SELECT *
+            FROM (
+                SELECT {columns_str}
+                FROM (
+                    SELECT {key_columns_str}, argMax(tuple({row_str}), (_version, _row_hash)) as _row
+                    FROM (
+                        SELECT *, created_at as _version, cityHash64({row_str}) as _row_hash
+                        FROM {table}
+                        {f'WHERE ({key_columns_str}) IN (SELECT {key_columns_str} FROM {table} {where_str})'
+                         if where_str else ''}
+                    )
+                    GROUP BY {key_columns_str}
+                )
+            )
+            {where_str}
+            """
+        else:
+            raise ValueError(f"Invalid dedup={dedup}")
+
+    @add_db_client(write=True)
+    def optimize_tables(self, db_client: Client = None):
+        for table in (self.table_uservectors, self.table_eventvectors):
+            db_client.execute(f"OPTIMIZE TABLE {table} FINAL")
+
+    @add_db_client(write=True)
     def insert_prepared_data(
         self,
         uservectors: pd.DataFrame,
         eventvectors: pd.DataFrame,
+        optimize_after_insert: bool = False,
         db_client: Client = None,
     ):
         uservectors_create_columns = [
@@ -76,6 +144,11 @@ class PreparedDataConnector:
         """
         db_client.execute(create_table_query)
 
+        from .normalization import normalize_dataframe_for_insert
+
+        uservectors = normalize_dataframe_for_insert(self.table_uservectors, uservectors, db_client)
+        eventvectors = normalize_dataframe_for_insert(self.table_eventvectors, eventvectors, db_client)
+
         uservectors_columns = ', '.join([f'`{x}`' for x in uservectors.columns])
         uservectors_insert_query = f"""INSERT INTO {self.table_uservectors} ({uservectors_columns}) VALUES"""
         self._insert_df_in_chunks_if_needed(uservectors_insert_query, uservectors, db_client)
@@ -84,11 +157,15 @@ class PreparedDataConnector:
         eventvectors_insert_query = f"""INSERT INTO {self.table_eventvectors} ({eventvectors_columns}) VALUES"""
         self._insert_df_in_chunks_if_needed(eventvectors_insert_query, eventvectors, db_client)
 
+        if optimize_after_insert:
+            self.optimize_tables(db_client=db_client)
+
     @add_db_client
     def get_prepated_data(
         self,
         start_dt: datetime = None,
         end_dt: datetime = None,
+        dedup: DedupMode | None = None,
         db_client: Client = None,
     ) -> tuple[pd.DataFrame, pd.DataFrame]:
         where_parts = []
@@ -102,29 +179,26 @@ class PreparedDataConnector:
             where_parts.append("install_time <= %(end_date)s")
             where_args["end_date"] = end_dt
 
-        query = f"""
-        SELECT *
-        FROM {self.table_uservectors}
-        {('WHERE ' + ' AND '.join(where_parts)) if len(where_parts) > 0 else ''}
-        """
-
-        uservectors = db_client.query_dataframe(query, where_args)
+        settings = {"optimize_aggregation_in_order": 1} if dedup == "argmax" else None
 
-        query = f"""
-        SELECT *
-        FROM {self.table_eventvectors}
-        {('WHERE ' + ' AND '.join(where_parts)) if len(where_parts) > 0 else ''}
-        """
+        query = self._create_dedup_select_query(
+            self.table_uservectors, self.key_columns_uservectors, where_parts, dedup, db_client
+        )
+        uservectors = db_client.query_dataframe(query, where_args, settings=settings)
 
-        eventvectors = db_client.query_dataframe(query, where_args)
+        query = self._create_dedup_select_query(
+            self.table_eventvectors, self.key_columns_eventvectors, where_parts, dedup, db_client
+        )
+        eventvectors = db_client.query_dataframe(query, where_args, settings=settings)
 
         return uservectors, eventvectors
 
-    @add_db_client
+    @add_db_client(use_numpy=False)
     def get_number_of_users(
         self,
         start_dt: datetime = None,
         end_dt: datetime = None,
+        dedup: DedupMode | None = None,
         db_client: Client = None,
     ) -> float:
         where_parts = []
@@ -139,17 +213,19 @@ class PreparedDataConnector:
             where_args["end_date"] = end_dt
 
         query = f"""
-        SELECT uniq(user_mmp_id) as result
-        FROM {self.table_eventvectors}
-        {('WHERE ' + ' AND '.join(where_parts)) if len(where_parts) > 0 else ''}
+        SELECT {'uniqExact' if dedup == 'argmax' else 'uniq'}(user_mmp_id) as result
+        FROM ({self._create_dedup_select_query(
+            self.table_eventvectors, self.key_columns_eventvectors, where_parts, dedup, db_client
+        )})
         """
-        return db_client.query_dataframe(query, where_args).iloc[0, 0]
+        return db_client.execute(query, where_args)[0][0]
 
-    @add_db_client
+    @add_db_client(use_numpy=False)
     def get_number_of_events(
         self,
         start_dt: datetime = None,
         end_dt: datetime = None,
+        dedup: DedupMode | None = None,
         db_client: Client = None,
     ) -> float:
         where_parts = []
@@ -165,10 +241,11 @@ class PreparedDataConnector:
 
         query = f"""
         SELECT count(1) as result
-        FROM {self.table_eventvectors}
-        {('WHERE ' + ' AND '.join(where_parts)) if len(where_parts) > 0 else ''}
+        FROM ({self._create_dedup_select_query(
+            self.table_eventvectors, self.key_columns_eventvectors, where_parts, dedup, db_client
+        )})
         """
-        return db_client.query_dataframe(query, where_args).iloc[0, 0]
+        return db_client.execute(query, where_args)[0][0]
 
     @add_db_client
     def get_number_of_events_per_install_hour_in_prepared_data(
@@ -197,7 +274,7 @@ class PreparedDataConnector:
         df = db_client.query_dataframe(query, where_args)
         return df.set_index("install_hour")["number_of_events"]
 
-    @add_db_client
+    @add_db_client(use_numpy=False)
     def get_number_of_install_dates(
         self,
         start_dt: datetime = None,
@@ -221,9 +298,9 @@ class PreparedDataConnector:
         {('WHERE ' + ' AND '.join(where_parts)) if len(where_parts) > 0 else ''}
         """
 
-        return db_client.query_dataframe(query, where_args).iloc[0, 0]
+        return db_client.execute(query, where_args)[0][0]
 
-    @add_db_client
+    @add_db_client(use_numpy=False)
     def get_earliest_install_date_with_no_prediction(
         self,
         event_id: uuid.UUID | None,
@@ -261,12 +338,45 @@ class PreparedDataConnector:
         {('AND ' + ' AND '.join(where_parts)) if len(where_parts) > 0 else ''}
         """
 
-        return db_client.query_dataframe(query, where_args).iloc[0, 0]
+        return db_client.execute(query, where_args)[0][0]
     
-    @add_db_client
+    @add_db_client(use_numpy=False)
     def get_max_install_time(self, db_client: Client = None) -> datetime:
         query = f"""
         SELECT max(install_time) as result
         FROM {self.table_uservectors}
         """
-        return db_client.query_dataframe(query).iloc[0, 0]
+        return db_client.execute(query)[0][0]
+
+    def export_to_parquet(
+        self,
+        output_dir: str,
+        start_date: date = None,
+        end_date: date = None,
+        max_workers: int = 4,
+        block_size: int = 100_000,
+    ) -> dict[str, dict[str, int]]:
+        from .export import export_table_to_parquet
+
+        where_parts, where_args = [], {}
+
+        if start_date:
+            where_parts.append("toDate(install_time) >= %(start_date)s")
+            where_args["start_date"] = start_date
+
+        if end_date:
+            where_parts.append("toDate(install_time) <= %(end_date)s")
+            where_args["end_date"] = end_date
+
+        return {
+            name: export_table_to_parquet(
+                table,
+                os.path.join(output_dir, f"{self.pipeline_id}_{name}"),
+                {"install_date": "toDate(install_time)"},
+                where_parts,
+                where_args,
+                max_workers=max_workers,
+                block_size=block_size,
+            )
+            for name, table in (("uservectors", self.table_uservectors), ("eventvectors", self.table_eventvectors))
+        }
@@ -0,0 +1,737 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime
+import logging
+import typing
+from clickhouse_driver.errors import ServerException
+
+from .connection import HEAVY_READ_PROFILE, Client, add_db_client, get_shard_numbers
+
+if typing.TYPE_CHECKING:
+    import pandas as pd
+
+
+@dataclass(frozen=True)
+class RawDataTableSpec:
+    table_name: str
+    user_id_column: str
+    install_time_column: str
+    event_time_column: str
+    event_name_column: str
+    # SQL expression returning revenue of an event as Float64
+    revenue_expression: str
+    # SQL conditions splitting records by delivery source, each source is censored separately
+    record_source_conditions: tuple[str, ...] = ("1",)
+    create_table_query: str = None
+
+
+class RawDataConnector:
+    spec: RawDataTableSpec = None
+
+    def __init__(self) -> None:
+        if self.spec is None:
+            raise TypeError(f"{type(self).__name__} has no spec, use a tracker specific connector")
+
+        self.table_name = self.spec.table_name
+        self.user_id_column = self.spec.user_id_column
+        self.install_time_column = self.spec.install_time_column
+        self.event_time_column = self.spec.event_time_column
+        self.event_name_column = self.spec.event_name_column
+        self.revenue_expression = self.spec.revenue_expression
+        self.record_source_conditions = self.spec.record_source_conditions
+        self.outliers_table_name = f"{self.table_name}_outliers"
+        self.outliers_staging_table_name = f"{self.table_name}_outliers_staging"
+        self.outlier_metrics = ("number_of_events", "max_time_from_install")
+        self.execution_profiles = {
+            "load_raw_data": HEAVY_READ_PROFILE,
+            "calculate_metrics_for_outlier_detection_by_user": HEAVY_READ_PROFILE,
+            "detect_outlier_users": HEAVY_READ_PROFILE,
+            "calculate_target_for_app_users": HEAVY_READ_PROFILE,
+        }
+
+    @add_db_client(write=True)
+    def init_db(self, db_client: Client = None):
+        query = """CREATE DATABASE IF NOT EXISTS raw_data"""
+        db_client.execute(query)
+
+        if self.spec.create_table_query:
+            db_client.execute(self.spec.create_table_query)
+
+        self._create_outliers_table(db_client)
+
+    @add_db_client(use_numpy=False)
+    def are_records_present_for_application_id(
+        self,
+        application_id: str,
+        start_dt: datetime = None,
+        end_dt: datetime = None,
+        db_client: Client = None,
+    ) -> bool:
+        where_parts = [
+            "app_id = %(application_id)s",
+        ]
+        where_args = {"application_id": application_id}
+
+        if start_dt:
+            where_parts.append(f"{self.event_time_column} >= %(start_date)s")
+            where_args["start_date"] = start_dt
+
+        if end_dt:
+            where_parts.append(f"{self.event_time_column} <= %(end_date)s")
+            where_args["end_date"] = end_dt
+
+        query = f"""
+        SELECT count(1) as count
+        FROM {self.table_name}
+        WHERE {' AND '.join(where_parts)}
+        """
+
+        return db_client.execute(query, where_args)[0][0] > 0
+
+    @add_db_client(use_numpy=False)
+    def get_number_of_installs(
+        self, application_id: str, db_client: Client = None
+    ) -> int:
+        query = f"""SELECT uniq({self.user_id_column}) as uniq
+        FROM {self.table_name}
+        WHERE app_id = %(application_id)s"""
+
+        return db_client.execute(query, {"application_id": application_id})[0][0]
+
+    @add_db_client
+    def get_number_of_events_per_date(
+        self,
+        application_id: str,
+        start_dt: datetime = None,
+        end_dt: datetime = None,
+        db_client: Client = None,
+    ) -> pd.Series:
+        where_parts = [
+            "app_id = %(application_id)s",
+        ]
+        where_args = {"application_id": application_id}
+
+        if start_dt:
+            where_parts.append(f"{self.event_time_column} >= %(start_date)s")
+            where_args["start_date"] = start_dt
+
+        if end_dt:
+            where_parts.append(f"{self.event_time_column} <= %(end_date)s")
+            where_args["end_date"] = end_dt
+
+        query = f"""
+        SELECT toDate({self.event_time_column}) as event_date, count(1) as number_of_events
+        FROM {self.table_name}
+        WHERE {' AND '.join(where_parts)} AND {self.event_time_column} is not null
+        GROUP BY event_date
+        """
+
+        df = db_client.query_dataframe(query, where_args)
+        return df.set_index("event_date")["number_of_events"]
+
+    @add_db_client(use_numpy=False)
+    def get_avg_number_of_events_per_user(
+        self,
+        application_id: str,
+        start_dt: datetime = None,
+        end_dt: datetime = None,
+        db_client: Client = None,
+    ) -> int:
+        where_parts = [
+            "app_id = %(application_id)s",
+        ]
+        where_args = {"application_id": application_id}
+
+        if start_dt:
+            where_parts.append(f"{self.event_time_column} >= %(start_date)s")
+            where_args["start_date"] = start_dt
+
+        if end_dt:
+            where_parts.append(f"{self.event_time_column} <= %(end_date)s")
+            where_args["end_date"] = end_dt
+
+        query = f"""
+        SELECT count(1) / uniq({self.user_id_column}) as result
+        FROM {self.table_name}
+        WHERE {' AND '.join(where_parts)}
+        """
+
+        return db_client.execute(query, where_args)[0][0]
+
+    @add_db_client
+    def load_raw_data(
+        self,
+        application_id: str,
+        install_dt_from: datetime,
+        install_dt_to: datetime,
+        max_seconds_from_install: int = None,
+        exclude_outliers: bool = False,
+        shard_fan_out: bool = False,
+        shard_num: int = None,
+        db_client: Client = None,
+    ) -> pd.DataFrame:
+        if shard_fan_out:
+            import pandas as pd
+
+            # every shard is read through its own connection, so the pool spreads them over replicas
+            shard_numbers = get_shard_numbers(db_client=db_client)
+            with ThreadPoolExecutor(max_workers=len(shard_numbers)) as executor:
+                dfs = executor.map(
+                    lambda x: self.load_raw_data(
+                        application_id,
+                        install_dt_from,
+                        install_dt_to,
+                        max_seconds_from_install=max_seconds_from_install,
+                        exclude_outliers=exclude_outliers,
+                        shard_num=x,
+                    ),
+                    shard_numbers,
+                )
+                return pd.concat(list(dfs), ignore_index=True)
+
+        where_parts = [
+            "app_id = %(application_id)s",
+            f"{self.install_time_column} >= %(install_dt_from)s",
+            f"{self.install_time_column} <= %(install_dt_to)s",
+        ]
+        where_args = {
+            "application_id": application_id,
+            "install_dt_from": install_dt_from,
+            "install_dt_to": install_dt_to,
+        }
+
+        if max_seconds_from_install:
+            where_parts.append(
+                f"date_diff('second', {self.install_time_column}, {self.event_time_column})"
+                " <= %(max_seconds_from_install)s"
+            )
+            where_args["max_seconds_from_install"] = max_seconds_from_install
+
+        if shard_num is not None:
+            # _shard_num is a virtual column of Distributed tables
+            where_parts.append("_shard_num = %(shard_num)s")
+            where_args["shard_num"] = shard_num
+
+        if exclude_outliers and not db_client.execute(f"EXISTS TABLE {self.outliers_table_name}")[0][0]:
+            logging.warning(f"{self.outliers_table_name} doesn't exist, outliers are not excluded")
+        elif exclude_outliers:
+            # filled by detect_outlier_users(save_to_table=True), users flagged in any window are excluded
+            where_parts.append(
+                f"""{self.user_id_column} NOT IN (
+                    SELECT user_mmp_id FROM {self.outliers_table_name} WHERE app_id = %(application_id)s
+                )"""
+            )
+
+        query = f"""
+        SELECT *
+        FROM {self.table_name}
+        WHERE {' AND '.join(where_parts)}
+        """
+
+        settings = {"optimize_skip_unused_shards": 1} if shard_num is not None else None
+        df = db_client.query_dataframe(query, where_args, settings=settings)
+        df["user_mmp_id"] = df[self.user_id_column]
+        # the rest of the pipeline expects appsflyer-like names for time columns
+        return df.rename(columns={self.install_time_column: "install_time", self.event_time_column: "event_time"})
+
+    def create_query_to_calculate_outlier_metrics(
+        self,
+        application_id: str,
+        start_date: date = None,
+        end_date: date = None,
+    ) -> tuple[str, dict]:
+        where_parts = [
+            "app_id = %(application_id)s",
+        ]
+        where_args = {"application_id": application_id}
+
+        if start_date:
+            where_parts.append(f"{self.install_time_column} >= %(start_date)s")
+            where_args["start_date"] = start_date
+
+        if end_date:
+            where_parts.append(f"{self.install_time_column} <= %(end_date)s")
+            where_args["end_date"] = end_date
+
+        query = f"""
+        SELECT {self.user_id_column} as user_mmp_id, count(1) as number_of_events,
+            max(date_diff('second', {self.install_time_column}, {self.event_time_column})) as max_time_from_install
+        FROM {self.table_name}
+        WHERE {' AND '.join(where_parts)}
+        GROUP BY user_mmp_id
+        """
+
+        return query, where_args
+
+    @add_db_client
+    def calculate_metrics_for_outlier_detection_by_user(
+        self,
+        application_id: str,
+        start_date: date = None,
+        end_date: date = None,
+        db_client: Client = None,
+    ) -> pd.DataFrame:
+        query, where_args = self.create_query_to_calculate_outlier_metrics(application_id, start_date, end_date)
+
+        df = db_client.query_dataframe(query, where_args)
+        return df
+
+    def _create_outlier_threshold_expression(
+        self,
+        metric: str,
+        method: typing.Literal['quantile', 'iqr', 'zscore'],
+    ) -> str:
+        if method == 'quantile':
+            return f"quantileTDigest(%(quantile)s)({metric})"
+        elif method == 'iqr':
+            return f"""quantilesTDigest(0.25, 0.75)({metric})[2]
+                + %(iqr_multiplier)s * (quantilesTDigest(0.25, 0.75)({metric})[2]
+                    - quantilesTDigest(0.25, 0.75)({metric})[1])"""
+        elif method == 'zscore':
+            return f"avg({metric}) + %(zscore_threshold)s * stddevPop({metric})"
+        else:
+            raise ValueError(f'Invalid method={method}')
+
+    @add_db_client(use_numpy=False)
+    def detect_outlier_users(
+        self,
+        application_id: str,
+        start_date: date = None,
+        end_date: date = None,
+        method: typing.Literal['quantile', 'iqr', 'zscore'] = 'quantile',
+        quantile: float = 0.99,
+        iqr_multiplier: float = 1.5,
+        zscore_threshold: float = 3.0,
+        save_to_table: bool = False,
+        db_client: Client = None,
+    ) -> tuple[list[str], dict[str, float]]:
+        metrics_query, where_args = self.create_query_to_calculate_outlier_metrics(
+            application_id, start_date, end_date
+        )
+        where_args = {
+            **where_args,
+            "quantile": quantile,
+            "iqr_multiplier": iqr_multiplier,
+            "zscore_threshold": zscore_threshold,
+        }
+
+        thresholds_str = ', '.join([self._create_outlier_threshold_expression(x, method) for x in self.outlier_metrics])
+        # thresholds are a scalar subquery, so detection is a single query returning one row even without outliers
+        query = f"""
+        WITH (SELECT tuple({thresholds_str}) FROM ({metrics_query})) as thresholds
+        SELECT thresholds, groupArray(tuple(user_mmp_id, {', '.join(self.outlier_metrics)}))
+        FROM ({metrics_query})
+        WHERE {' OR '.join([f'{x} > tupleElement(thresholds, {i + 1})' for i, x in enumerate(self.outlier_metrics)])}
+        """
+        threshold_values, outliers = db_client.execute(query, where_args)[0]
+        thresholds = dict(zip(self.outlier_metrics, threshold_values))
+
+        if save_to_table:
+            # detection is a read, only saving goes through a write connection
+            self._save_outliers(application_id, start_date, end_date, outliers)
+
+        return [x[0] for x in outliers], thresholds
+
+    @add_db_client(use_numpy=False, write=True)
+    def _save_outliers(
+        self,
+        application_id: str,
+        start_date: date,
+        end_date: date,
+        outliers: list[tuple],
+        db_client: Client = None,
+    ):
+        self._create_outliers_table(db_client)
+        # every detection window has its own partition, so saving one window keeps the others
+        where_args = {
+            "application_id": application_id,
+            "detection_window": f"{start_date or ''}..{end_date or ''}",
+        }
+        partition = "(%(application_id)s, %(detection_window)s)"
+
+        db_client.execute(f"ALTER TABLE {self.outliers_staging_table_name} DROP PARTITION {partition}", where_args)
+        db_client.execute(
+            f"""INSERT INTO {self.outliers_staging_table_name}
+            (app_id, detection_window, user_mmp_id, {', '.join(self.outlier_metrics)}) VALUES""",
+            [(application_id, where_args["detection_window"], *x) for x in outliers],
+        )
+        # REPLACE PARTITION swaps the parts atomically, readers never see a partially saved window
+        db_client.execute(
+            f"""ALTER TABLE {self.outliers_table_name}
+            REPLACE PARTITION {partition} FROM {self.outliers_staging_table_name}""",
+            where_args,
+        )
+
+    def _create_outliers_table(self, db_client: Client):
+        db_client.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {self.outliers_table_name} (
+                app_id String,
+                detection_window String,
+                user_mmp_id String,
+                number_of_events UInt64,
+                max_time_from_install Int64,
+                created_at DateTime default now()
+            ) ENGINE = MergeTree()
+            PARTITION BY (app_id, detection_window)
+            ORDER BY (app_id, user_mmp_id)
+            """
+        )
+        db_client.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.outliers_staging_table_name} AS {self.outliers_table_name}"
+        )
+
+    @add_db_client
+    def get_number_of_installs_per_date(
+        self,
+        application_id: str,
+        start_dt: datetime = None,
+        end_dt: datetime = None,
+        censoring_period_seconds: int = None,
+        db_client: Client = None,
+    ) -> pd.Series:
+        where_parts = [
+            "app_id = %(application_id)s",
+        ]
+        where_args = {"application_id": application_id}
+
+        if start_dt:
+            where_parts.append(f"{self.install_time_column} >= %(start_date)s")
+            where_args["start_date"] = start_dt
+
+        if end_dt:
+            where_parts.append(f"{self.install_time_column} <= %(end_date)s")
+            where_args["end_date"] = end_dt
+
+        if censoring_period_seconds:
+            # every record source is delivered with its own delay, so each one is censored by its own max event time
+            where_parts.append(
+                "("
+                + " OR ".join(
+                    f"""(({condition}) AND date_diff('second', {self.install_time_column}, max_event_time_{i})
+                        > %(censoring_period_seconds)s)"""
+                    for i, condition in enumerate(self.record_source_conditions)
+                )
+                + ")"
+            )
+            where_args["censoring_period_seconds"] = censoring_period_seconds
+
+        max_event_time_queries = ",\n".join(
+            f"""(
+            SELECT max({self.event_time_column}) FROM {self.table_name}
+                WHERE app_id = %(application_id)s
+                    AND ({condition})
+        ) as max_event_time_{i}"""
+            for i, condition in enumerate(self.record_source_conditions)
+        )
+
+        query = f"""
+        WITH {max_event_time_queries}
+
+        SELECT toDate({self.install_time_column}) as install_date, uniq({self.user_id_column}) as number_of_installs
+        FROM {self.table_name}
+        WHERE {' AND '.join(where_parts)} AND {self.install_time_column} is not null
+        GROUP BY install_date
+        """
+
+        df = db_client.query_dataframe(query, where_args)
+        return df.set_index("install_date")["number_of_installs"]
+
+    @add_db_client
+    def get_number_of_events_per_install_hour(
+        self,
+        application_id: str,
+        start_dt: datetime = None,
+        end_dt: datetime = None,
+        db_client: Client = None,
+    ):
+        where_parts = [
+            "app_id = %(application_id)s",
+        ]
+        where_args = {"application_id": application_id}
+
+        if start_dt:
+            where_parts.append(f"{self.install_time_column} >= %(start_date)s")
+            where_args["start_date"] = start_dt
+
+        if end_dt:
+            where_parts.append(f"{self.install_time_column} <= %(end_date)s")
+            where_args["end_date"] = end_dt
+
+        query = f"""
+        SELECT date_trunc('hour', {self.install_time_column}) as install_hour, count(1) as number_of_events
+        FROM {self.table_name}
+        WHERE {' AND '.join(where_parts)} AND {self.install_time_column} is not null
+        GROUP BY install_hour
+        """
+
+        df = db_client.query_dataframe(query, where_args)
+        return df.set_index("install_hour")["number_of_events"]
+
+    @add_db_client
+    def get_number_of_installs_by_install_date(self, application_id: str, db_client: Client=None) -> pd.DataFrame:
+        query = f"""
+            SELECT count(1) as count, toDate({self.install_time_column}) as install_date
+            FROM {self.table_name}
+            WHERE app_id = %(application_id)s AND {self.install_time_column} is not null
+            GROUP BY install_date
+            """
+
+        df = db_client.query_dataframe(query, {"application_id": application_id})
+        return df
+
+    @add_db_client(use_numpy=False)
+    def get_avg_number_of_events_per_day(self, application_id: str, db_client: Client) -> float:
+        query = f"""
+            SELECT count(1) / uniq(toDate({self.event_time_column})) as result
+            FROM {self.table_name}
+            WHERE app_id = %(application_id)s
+            """
+
+        return db_client.execute(query, {"application_id": application_id})[0][0]
+    
+    @add_db_client(use_numpy=False)
+    def get_max_number_of_events_per_day(self, application_id: str, db_client: Client=None) -> float:
+        query = f"""
+            SELECT max(day_count) as result
+            FROM (
+                SELECT toDate({self.event_time_column}) as event_date, count(1) as day_count
+                FROM {self.table_name}
+                WHERE app_id = %(application_id)s AND {self.event_time_column} is not null
+                GROUP BY event_date
+            )
+            """
+
+        return db_client.execute(query, {"application_id": application_id})[0][0]
+
+    @add_db_client(use_numpy=False)
+    def get_number_of_events_in_date_range(
+        self, application_id: str, start_date: datetime, end_date: datetime, db_client: Client=None
+    ) -> int:
+        query = f"""
+            SELECT count(1) as count
+            FROM {self.table_name}
+            WHERE app_id = %(application_id)s
+                AND toDate({self.install_time_column}) >= toDate(%(start_date)s)
+                AND toDate({self.install_time_column}) <= toDate(%(end_date)s)
+        """
+
+        return db_client.execute(
+            query,
+            {
+                "application_id": application_id,
+                "start_date": start_date,
+                "end_date": end_date,
+            },
+        )[0][0]
+
+    @add_db_client(write=True)
+    def save_loaded_data(self, df: pd.DataFrame, db_client: Client=None, cb_on_failure=None, normalize: bool = True):
+        # imported here to keep pandas out of the package import
+        from .normalization import InsertNormalizationError, normalize_dataframe_for_insert
+
+        if normalize:
+            try:
+                df = normalize_dataframe_for_insert(self.table_name, df, db_client)
+            except InsertNormalizationError as e:
+                logging.error(f"DataFrame can't be saved to Clickhouse: {e}")
+
+                if callable(cb_on_failure):
+                    cb_on_failure(df)
+                    return
+                else:
+                    raise e
+
+        columns = ", ".join(df.columns)
+
+        query = f"""INSERT INTO {self.table_name} ({columns}) VALUES"""
+
+        try:
+            db_client.insert_dataframe(query, df)
+        except ServerException as e:
+            err_str = str(e)
+            if "Code: 241" in err_str:
+                logging.error(f"Got Clickhouse memory limit exceeded error for df.shape={df.shape}: {err_str}, will split insert")
+                logging.exception(e)
+            self.save_loaded_data(
+                df.iloc[: len(df) // 2], db_client=db_client, cb_on_failure=cb_on_failure, normalize=False
+            )
+            self.save_loaded_data(
+                df.iloc[len(df) // 2 :], db_client=db_client, cb_on_failure=cb_on_failure, normalize=False
+            )
+        except Exception as e:
+            logging.error(f"Unknown error while saving data to Clickhouse: {e}")
+            logging.exception(e)
+
+            if callable(cb_on_failure):
+                cb_on_failure(df)
+            else:
+                raise e
+            
+    @add_db_client(use_numpy=False)
+    def get_avg_lifetime_in_seconds_for_max_lifetime(
+        self,
+        application_id: str,
+        max_lifetime_seconds: int,
+        start_dt: datetime = None,
+        end_dt: datetime = None,
+        db_client: Client = None,
+    ) -> float:
+        where_parts = [
+            "app_id = %(application_id)s",
+            f"date_diff('second', {self.install_time_column}, {self.event_time_column}) <= %(max_lifetime_seconds)s",
+        ]
+        where_args = {
+            "application_id": application_id,
+            "max_lifetime_seconds": max_lifetime_seconds,
+        }
+
+        if start_dt:
+            where_parts.append(f"{self.install_time_column} >= %(start_date)s")
+            where_args["start_date"] = start_dt
+
+        if end_dt:
+            where_parts.append(f"{self.install_time_column} <= %(end_date)s")
+            where_args["end_date"] = end_dt
+
+        query = f"""
+            select avg(c) from (
+                select {self.user_id_column},
+                    max(date_diff('second', {self.install_time_column}, {self.event_time_column})) as c
+                from {self.table_name}
+                where {' AND '.join(where_parts)}
+                group by {self.user_id_column}
+            );
+        """
+
+        return db_client.execute(query, where_args)[0][0]
+
+    @add_db_client(use_numpy=False)
+    def count_records_in_table(self, db_client: Client=None):
+        query = f"""SELECT count(1) as count FROM {self.table_name}"""
+
+        return db_client.execute(query)[0][0]
+
+    def export_to_parquet(
+        self,
+        output_dir: str,
+        application_id: str = None,
+        start_date: date = None,
+        end_date: date = None,
+        max_workers: int = 4,
+        block_size: int = 100_000,
+    ) -> dict[str, int]:
+        # pyarrow is an optional dependency, see the parquet extra
+        from .export import export_table_to_parquet
+
+        where_parts, where_args = [], {}
+
+        if application_id:
+            where_parts.append("app_id = %(application_id)s")
+            where_args["application_id"] = application_id
+
+        if start_date:
+            where_parts.append(f"toDate({self.install_time_column}) >= %(start_date)s")
+            where_args["start_date"] = start_date
+
+        if end_date:
+            where_parts.append(f"toDate({self.install_time_column}) <= %(end_date)s")
+            where_args["end_date"] = end_date
+
+        return export_table_to_parquet(
+            self.table_name,
+            output_dir,
+            {"app_id": "app_id", "install_date": f"toDate({self.install_time_column})"},
+            where_parts,
+            where_args,
+            max_workers=max_workers,
+            block_size=block_size,
+        )
+    
+    def create_query_to_calculate_target(
+        self,
+        application_id: str,
+        target_type: typing.Literal['ltv', 'number_of_conversions', 'lt'],
+        target_calculation_period_in_seconds: int,
+        convertion_event_names: list[str] = None,
+        start_dt: datetime = None,
+        end_dt: datetime = None,
+        add_fields_to_take_first: list[str] = None,
+    ) -> tuple[str, dict]:
+        if target_type in ('ltv', 'number_of_conversions') and not convertion_event_names:
+            raise ValueError(f'convertion_event_names must be provided for target_type={target_type}')
+        
+        where_parts = [
+            "app_id = %(application_id)s",
+            f"date_diff('second', {self.install_time_column}, {self.event_time_column})"
+            " <= %(target_calculation_period_in_seconds)s"
+        ]
+        where_args = {
+            "application_id": application_id, 
+            "target_calculation_period_in_seconds": target_calculation_period_in_seconds
+        }
+
+        if start_dt:
+            where_parts.append(f"{self.install_time_column} >= %(start_dt)s")
+            where_args["start_dt"] = start_dt
+
+        if end_dt:
+            where_parts.append(f"{self.install_time_column} <= %(end_dt)s")
+            where_args["end_dt"] = end_dt
+
+        fields_to_take_first_str = (', '.join([f'first_value({x}) as {x}_fv' for x in add_fields_to_take_first]) + ', ') if add_fields_to_take_first else ''
+
+        if target_type == 'ltv':
+            query = f"""
+            SELECT {self.user_id_column} as user_mmp_id, {fields_to_take_first_str}
+                sum(if({self.event_name_column} IN %(convertion_event_names)s, {self.revenue_expression}, 0)) as target
+            FROM {self.table_name}
+            WHERE {' AND '.join(where_parts)}
+            GROUP BY user_mmp_id"""
+            where_args['convertion_event_names'] = convertion_event_names
+        elif target_type == 'number_of_conversions':
+            query = f"""
+            SELECT {self.user_id_column} as user_mmp_id, {fields_to_take_first_str}
+                sum({self.event_name_column} IN %(convertion_event_names)s) as target
+            FROM {self.table_name}
+            WHERE {' AND '.join(where_parts)}
+            GROUP BY user_mmp_id"""
+            where_args['convertion_event_names'] = convertion_event_names
+        elif target_type == 'lt':
+            query = f"""
+            SELECT {self.user_id_column} as user_mmp_id, {fields_to_take_first_str}
+                max(date_diff('second', {self.install_time_column}, {self.event_time_column})) as target
+            FROM {self.table_name}
+            WHERE {' AND '.join(where_parts)}
+            GROUP BY user_mmp_id"""
+        else:
+            raise ValueError(f'Invalid target_type={target_type}')
+        
+        return query, where_args
+    
+    @add_db_client
+    def calculate_target_for_app_users(
+        self,
+        application_id: str,
+        target_type: typing.Literal['ltv', 'number_of_conversions', 'lt'],
+        target_calculation_period_in_seconds: int,
+        convertion_event_names: list[str] = None,
+        start_dt: datetime = None,
+        end_dt: datetime = None,
+        db_client: Client = None
+    ) -> pd.Series:
+        
+        query, where_args = self.create_query_to_calculate_target(
+            application_id,
+            target_type,
+            target_calculation_period_in_seconds,
+            convertion_event_names,
+            start_dt,
+            end_dt
+        )
+        
+        df = db_client.query_dataframe(query, where_args)
+        return df.set_index('user_mmp_id')['target']
+
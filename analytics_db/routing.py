@@ -0,0 +1,93 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+@dataclass(eq=False)
+class HostState:
+    host: str
+    port: int
+    failures: int = 0
+    unhealthy_until: float = 0.0
+    in_flight: int = 0
+
+    @property
+    def is_healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+
+def parse_hosts(hosts: str, default_port: int) -> list[tuple[str, int]]:
+    result = []
+    for x in hosts.split(","):
+        x = x.strip()
+        if not x:
+            continue
+        host, _, port = x.partition(":")
+        result.append((host, int(port) if port else default_port))
+    return result
+
+
+class HostPool:
+    def __init__(
+        self,
+        hosts: list[tuple[str, int]],
+        read_routing: str = "round_robin",
+        base_backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 60.0,
+    ):
+        if not hosts:
+            raise ValueError("at least one host should be provided")
+        if read_routing not in ("round_robin", "least_loaded"):
+            raise ValueError(f"Invalid read_routing={read_routing}")
+
+        self.hosts = [HostState(host, port) for host, port in hosts]
+        self.read_routing = read_routing
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._round_robin = itertools.count()
+        self._write_host = self.hosts[0]
+        self._lock = threading.Lock()
+
+    def choose_hosts(self, write: bool = False) -> list[HostState]:
+        with self._lock:
+            healthy = [x for x in self.hosts if x.is_healthy]
+            # when everything is down the host that recovers first is still worth a try
+            candidates = healthy or [min(self.hosts, key=lambda x: x.unhealthy_until)]
+
+            if write:
+                # writes stay on one host while it is healthy, so parts of one load are not spread over replicas
+                if self._write_host not in candidates:
+                    self._write_host = candidates[0]
+                first = self._write_host
+            elif self.read_routing == "least_loaded":
+                first = min(candidates, key=lambda x: x.in_flight)
+            else:
+                first = candidates[next(self._round_robin) % len(candidates)]
+
+            failover = sorted(
+                [x for x in self.hosts if x is not first], key=lambda x: (not x.is_healthy, x.unhealthy_until)
+            )
+            return [first] + failover
+
+    def mark_success(self, host: HostState):
+        with self._lock:
+            host.failures = 0
+            host.unhealthy_until = 0.0
+
+    def mark_failure(self, host: HostState):
+        with self._lock:
+            host.failures += 1
+            backoff = min(self.max_backoff_seconds, self.base_backoff_seconds * 2 ** (host.failures - 1))
+            host.unhealthy_until = time.monotonic() + backoff
+
+    @contextmanager
+    def acquire(self, host: HostState):
+        with self._lock:
+            host.in_flight += 1
+        try:
+            yield host
+        finally:
+            with self._lock:
+                host.in_flight -= 1
@@ -0,0 +1,82 @@
+"""Measures import time and memory of analytics_db in fresh interpreters.
+
+Every scenario runs in its own subprocess, so nothing is cached between them.
+Exits with a non-zero code when a scenario imports a forbidden module or goes over the limits:
+
+    python benchmarks/import_time.py --repeat 5 --max-seconds 0.5 --max-rss-mb 60
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+SCENARIOS = {
+    "bare interpreter": ("pass", ()),
+    "import analytics_db": ("import analytics_db", ("pandas", "numpy", "clickhouse_driver")),
+    "prepared data connector": (
+        "from analytics_db import get_prepared_data_db_connector; get_prepared_data_db_connector('bench')",
+        ("pandas", "numpy"),
+    ),
+    "raw data connector": (
+        "from analytics_db import get_db_connector_for_tracker; get_db_connector_for_tracker('appsflyer')",
+        ("pandas", "numpy"),
+    ),
+    "pandas (for reference)": ("import pandas", ()),
+}
+
+MEASURE_TEMPLATE = """
+import json, resource, sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": sorted(x for x in sys.modules if "." not in x),
+}}))
+"""
+
+
+def measure(code: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE_TEMPLATE.format(code=code)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main(args) -> int:
+    failed = False
+    for name, (code, forbidden_modules) in SCENARIOS.items():
+        try:
+            runs = [measure(code) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as e:
+            print(f"{name}: failed\n{e.stderr}")
+            failed = True
+            continue
+
+        seconds = statistics.median(x["seconds"] for x in runs)
+        max_rss_mb = statistics.median(x["max_rss_mb"] for x in runs)
+        imported = sorted(set(forbidden_modules) & set(runs[0]["modules"]))
+        print(f"{name}: {seconds * 1000:.1f}ms, max rss {max_rss_mb:.1f}MB, forbidden imported: {imported or '-'}")
+
+        if forbidden_modules:
+            if imported:
+                failed = True
+            if args.max_seconds is not None and seconds > args.max_seconds:
+                failed = True
+            if args.max_rss_mb is not None and max_rss_mb > args.max_rss_mb:
+                failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    parser.add_argument("--max-rss-mb", type=float, default=None)
+    sys.exit(main(parser.parse_args()))
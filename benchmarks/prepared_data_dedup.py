@@ -0,0 +1,82 @@
+"""Compares dedup strategies for reading prepared data.
+
+Needs a running ClickHouse configured through the usual DB_* env variables.
+Creates a throwaway pipeline, inserts every row twice and times each read mode:
+
+    python benchmarks/prepared_data_dedup.py --users 100000 --events-per-user 20
+"""
+import argparse
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from analytics_db import get_prepared_data_db_connector
+from analytics_db.connection import add_db_client
+
+
+def make_data(n_users: int, events_per_user: int, n_features: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+    rng = np.random.default_rng(0)
+    user_ids = np.array([str(uuid.uuid4()) for _ in range(n_users)])
+    install_time = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 86400 * 30, n_users), unit="s")
+
+    uservectors = pd.DataFrame({"user_mmp_id": user_ids, "install_time": install_time})
+    for i in range(n_features):
+        uservectors[f"f{i}"] = rng.random(n_users)
+
+    eventvectors = pd.DataFrame(
+        {
+            "user_mmp_id": np.repeat(user_ids, events_per_user),
+            "event_number": np.tile(np.arange(events_per_user), n_users),
+            "install_time": np.repeat(install_time, events_per_user),
+        }
+    )
+    for i in range(n_features):
+        eventvectors[f"f{i}"] = rng.random(len(eventvectors))
+
+    return uservectors, eventvectors
+
+
+def timeit(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+@add_db_client
+def main(args, db_client=None):
+    connector = get_prepared_data_db_connector(f"bench_dedup_{uuid.uuid4().hex[:8]}")
+    connector.init_db(db_client=db_client)
+
+    uservectors, eventvectors = make_data(args.users, args.events_per_user, args.features)
+    try:
+        for _ in range(2):
+            connector.insert_prepared_data(uservectors, eventvectors, db_client=db_client)
+
+        for dedup in (None, "final", "argmax"):
+            elapsed, (_, events) = timeit(connector.get_prepated_data, dedup=dedup, db_client=db_client)
+            count_elapsed, count = timeit(connector.get_number_of_events, dedup=dedup, db_client=db_client)
+            print(f"read dedup={dedup}: {elapsed:.3f}s rows={len(events)}; count: {count_elapsed:.3f}s result={count}")
+
+        def read_and_drop_duplicates():
+            _, events = connector.get_prepated_data(db_client=db_client)
+            return events.drop_duplicates(["user_mmp_id", "event_number"], keep="last")
+
+        elapsed, events = timeit(read_and_drop_duplicates)
+        print(f"read + pandas drop_duplicates: {elapsed:.3f}s rows={len(events)}")
+
+        optimize_elapsed, _ = timeit(connector.optimize_tables, db_client=db_client)
+        elapsed, (_, events) = timeit(connector.get_prepated_data, db_client=db_client)
+        print(f"OPTIMIZE FINAL: {optimize_elapsed:.3f}s, then plain read: {elapsed:.3f}s rows={len(events)}")
+    finally:
+        db_client.execute(f"DROP TABLE IF EXISTS {connector.table_uservectors}")
+        db_client.execute(f"DROP TABLE IF EXISTS {connector.table_eventvectors}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--events-per-user", type=int, default=20)
+    parser.add_argument("--features", type=int, default=10)
+    main(parser.parse_args())
@@ -9,6 +9,7 @@ setup(
     packages=find_packages(exclude=["tests", "tests.*"]),
     install_requires=["clickhouse-driver[lz4,zstd]==0.2.6"],
     extras_require = {
-        "pandas":  ["pandas==2.0.3"]
+        "pandas":  ["pandas==2.0.3"],
+        "parquet": ["pandas==2.0.3", "pyarrow==12.0.1"],
     }
 )
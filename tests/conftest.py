@@ -0,0 +1,53 @@
+import pytest
+
+
+class FakeConnection:
+    def __init__(self):
+        self.connected = False
+
+    def force_connect(self):
+        self.connected = True
+
+
+# stands in for connection.Client, every response is either a value or a callable of (query, params)
+class FakeClient:
+    def __init__(self, execute=None, query_dataframe=None, iter_column_blocks=None, host=None):
+        self.settings = {}
+        self.queries = []
+        self.inserts = []
+        self.host = host
+        self.connection = FakeConnection()
+        self.responses = {
+            "execute": execute if execute is not None else [],
+            "query_dataframe": query_dataframe,
+            "iter_column_blocks": iter_column_blocks if iter_column_blocks is not None else [],
+        }
+
+    def _respond(self, method: str, query: str, params):
+        self.queries.append((query, params))
+        response = self.responses[method]
+        return response(query, params) if callable(response) else response
+
+    def execute(self, query, params=None, **kwargs):
+        if isinstance(params, (list, tuple)):
+            self.inserts.append((query, params))
+            return len(params)
+        return self._respond("execute", query, params)
+
+    def query_dataframe(self, query, params=None, **kwargs):
+        return self._respond("query_dataframe", query, params)
+
+    def insert_dataframe(self, query, df, **kwargs):
+        self.inserts.append((query, df))
+        return len(df)
+
+    def iter_column_blocks(self, query, params=None, **kwargs):
+        return iter(self._respond("iter_column_blocks", query, params))
+
+    def disconnect(self):
+        self.connection.connected = False
+
+
+@pytest.fixture
+def fake_client():
+    return FakeClient
@@ -0,0 +1,59 @@
+import pytest
+
+from analytics_db.connection import Client, ExecutionProfile, QueryCancelledError
+
+
+class FakeProgress:
+    def __init__(self, progress, result):
+        self.progress = progress
+        self.result = result
+
+    def __iter__(self):
+        return iter(self.progress)
+
+    def get_result(self):
+        return self.result
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = Client(host="localhost")
+    client.cancelled = False
+    monkeypatch.setattr(client, "cancel", lambda: setattr(client, "cancelled", True))
+    return client
+
+
+def test_execute_cancels_on_estimated_rows(client, monkeypatch):
+    monkeypatch.setattr(client, "execute_with_progress", lambda *args, **kwargs: FakeProgress([(10, 1000)], [(1,)]))
+    client.execution_profile = ExecutionProfile(cancel_after_rows_to_read=100)
+
+    with pytest.raises(QueryCancelledError):
+        client.execute("SELECT count(1) FROM table")
+    assert client.cancelled
+
+
+def test_execute_returns_result_within_limits(client, monkeypatch):
+    monkeypatch.setattr(client, "execute_with_progress", lambda *args, **kwargs: FakeProgress([(10, 50)], [(42,)]))
+    client.execution_profile = ExecutionProfile(cancel_after_rows_to_read=100, cancel_after_seconds=60)
+
+    assert client.execute("SELECT count(1) FROM table")[0][0] == 42
+    assert not client.cancelled
+
+
+def test_execute_without_client_side_limits_skips_progress(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("progress should not be used")
+
+    monkeypatch.setattr(client, "execute_with_progress", fail)
+    monkeypatch.setattr(
+        "clickhouse_driver.Client.execute", lambda self, query, **kwargs: [(1,)]
+    )
+    client.execution_profile = ExecutionProfile(max_threads=4)
+
+    assert client.execute("SELECT 1") == [(1,)]
+
+
+def test_execution_profile_to_settings_skips_client_side_limits():
+    profile = ExecutionProfile(max_memory_usage=10, cancel_after_seconds=5)
+
+    assert profile.to_settings() == {"max_memory_usage": 10}
@@ -0,0 +1,55 @@
+import json
+import os
+import uuid
+
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+
+from analytics_db import export
+from analytics_db.export import _export_partition, export_table_to_parquet
+
+
+def test_export_partition_writes_numpy_blocks(tmp_path, fake_client):
+    user_id = uuid.uuid4()
+    columns_with_types = [("user_id", "UUID"), ("revenue", "Float64"), ("install_date", "Nullable(Date)")]
+    columns = [
+        np.array([user_id, None], dtype=object),
+        np.array([1.5, 2.0]),
+        np.array([None, None], dtype=object),
+    ]
+    # the first block is the header
+    client = fake_client(iter_column_blocks=[(columns_with_types, []), (columns_with_types, columns)])
+
+    path = str(tmp_path / "install_date=None" / "part-0.parquet")
+    number_of_rows = _export_partition(
+        "db.t", {"install_date": None}, {"install_date": "install_date"}, [], {}, path, 10, db_client=client
+    )
+
+    assert number_of_rows == 2
+    assert "isNull(install_date)" in client.queries[0][0]
+    assert "partition_install_date" not in client.queries[0][1]
+    table = pq.read_table(path)
+    assert table.column("user_id").to_pylist() == [str(user_id), None]
+    assert table.column("revenue").to_pylist() == [1.5, 2.0]
+
+
+def test_export_escapes_partition_values_and_records_finished_partitions(tmp_path, monkeypatch):
+    partitions = [{"app_id": "../evil"}, {"app_id": "bad"}, {"app_id": "a/b"}]
+    paths = []
+
+    def export_partition(table, partition, partition_expressions, where_parts, where_args, path, block_size):
+        paths.append(path)
+        if partition["app_id"] == "bad":
+            raise RuntimeError("export failed")
+        return 1
+
+    monkeypatch.setattr(export, "_get_partitions", lambda *args: partitions)
+    monkeypatch.setattr(export, "_export_partition", export_partition)
+
+    with pytest.raises(RuntimeError):
+        export_table_to_parquet("db.t", str(tmp_path), {"app_id": "app_id"}, max_workers=1)
+
+    with open(tmp_path / export.MANIFEST_FILE_NAME) as f:
+        assert json.load(f)["partitions"] == {"app_id=..%2Fevil": 1, "app_id=a%2Fb": 1}
+    assert all(os.path.dirname(os.path.dirname(x)) == str(tmp_path) for x in paths)
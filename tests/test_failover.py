@@ -0,0 +1,41 @@
+import os
+import socket
+
+import pytest
+
+from analytics_db import connection
+from analytics_db.routing import HostPool, parse_hosts
+
+# replicas from tests/docker-compose.yml
+DB_TEST_HOSTS = os.getenv("DB_TEST_HOSTS", "localhost:9001,localhost:9002")
+
+
+def _is_reachable(host: str, port: int) -> bool:
+    try:
+        with socket.create_connection((host, port), timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+@pytest.fixture
+def replicas(monkeypatch):
+    hosts = parse_hosts(DB_TEST_HOSTS, 9000)
+    if not all(_is_reachable(host, port) for host, port in hosts):
+        pytest.skip(f"Clickhouse replicas {DB_TEST_HOSTS} are not running, see tests/docker-compose.yml")
+
+    # a closed port in front of the live replicas, every read has to fail over at least once in round robin
+    pool = HostPool([("localhost", 1)] + hosts)
+    monkeypatch.setattr(connection, "_host_pool", pool)
+    return pool
+
+
+def test_reads_fail_over_to_live_replicas(replicas):
+    @connection.add_db_client(use_numpy=False)
+    def read_port(db_client=None):
+        return db_client.connection.port
+
+    ports = [read_port() for _ in range(len(replicas.hosts))]
+
+    assert set(ports) == {x.port for x in replicas.hosts[1:]}
+    assert not replicas.hosts[0].is_healthy
@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+
+from analytics_db.normalization import (
+    InsertNormalizationError,
+    clear_column_types_cache,
+    normalize_dataframe_for_insert,
+)
+
+
+@pytest.fixture
+def table_client(fake_client):
+    def create(column_types: dict[str, str], timezone: str = "UTC"):
+        return fake_client(
+            execute=lambda query, params: [[timezone]] if "timezone()" in query else list(column_types.items())
+        )
+
+    return create
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    clear_column_types_cache()
+    yield
+    clear_column_types_cache()
+
+
+def test_out_of_range_integers_are_reported(table_client):
+    df = pd.DataFrame({"x": [1, 300]})
+
+    with pytest.raises(InsertNormalizationError, match="don't fit UInt8"):
+        normalize_dataframe_for_insert("db.t", df, table_client({"x": "UInt8"}))
+
+
+def test_nulls_in_non_nullable_string_are_reported(table_client):
+    df = pd.DataFrame({"x": ["a", None]})
+
+    with pytest.raises(InsertNormalizationError, match="1 null values"):
+        normalize_dataframe_for_insert("db.t", df, table_client({"x": "String"}))
+
+    result = normalize_dataframe_for_insert("db.nullable", df, table_client({"x": "Nullable(String)"}))
+    assert result["x"].tolist() == ["a", None]
+
+
+def test_timezone_aware_values_keep_wall_time_of_column_timezone(table_client):
+    df = pd.DataFrame({"x": pd.to_datetime(["2023-01-01 10:00:00+03:00"]), "y": ["2023-01-01T07:00:00Z"]})
+    client = table_client({"x": "DateTime('Europe/Moscow')", "y": "DateTime"}, timezone="Europe/Berlin")
+
+    result = normalize_dataframe_for_insert("db.t", df, client)
+
+    assert result["x"].iloc[0] == pd.Timestamp("2023-01-01 10:00:00")
+    assert result["y"].iloc[0] == pd.Timestamp("2023-01-01 08:00:00")
+
+
+def test_mixed_datetime_formats_are_parsed(table_client):
+    df = pd.DataFrame({"x": ["2023-01-01", "2023-01-02 10:00:00.123", "bad"]})
+
+    with pytest.raises(InsertNormalizationError, match="1 values are not dates"):
+        normalize_dataframe_for_insert("db.t", df, table_client({"x": "DateTime64(3)"}))
+
+
+def test_epoch_seconds_are_kept_for_datetime_columns(table_client):
+    df = pd.DataFrame({"x": [1700000000, 1700000001]})
+
+    result = normalize_dataframe_for_insert("db.t", df, table_client({"x": "DateTime"}))
+
+    assert result["x"].tolist() == [1700000000, 1700000001]
+
+
+def test_nullable_big_integers_stay_exact(table_client):
+    df = pd.DataFrame({"x": pd.Series([2**62 + 1, None], dtype=object)})
+
+    result = normalize_dataframe_for_insert("db.t", df, table_client({"x": "Nullable(UInt64)"}))
+
+    assert result["x"].tolist() == [2**62 + 1, None]
+
+
+def test_string_dtype_values_bound_for_integers_are_reported(table_client):
+    df = pd.DataFrame({"x": pd.Series(["1", "a", None], dtype="string")})
+
+    with pytest.raises(InsertNormalizationError, match="1 values are not numeric"):
+        normalize_dataframe_for_insert("db.t", df, table_client({"x": "Nullable(Int32)"}))
+
+    df = pd.DataFrame({"x": pd.Series(["1", "2"], dtype="string")})
+    result = normalize_dataframe_for_insert("db.ints", df, table_client({"x": "Int32"}))
+    assert result["x"].dtype == "int32"
+    assert result["x"].tolist() == [1, 2]
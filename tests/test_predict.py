@@ -0,0 +1,54 @@
+import uuid
+
+import pandas as pd
+import pytest
+
+from analytics_db.appsflyer import AppsflyerRawDataConnector
+from analytics_db.predict import PredictDataConnector
+
+PREDICT_ID = uuid.uuid4()
+
+
+def test_sent_events_cant_be_evaluated(fake_client):
+    with pytest.raises(ValueError):
+        PredictDataConnector(is_sent_event=True).evaluate_predicts(
+            AppsflyerRawDataConnector(), "app", "lt", 3600, predict_id=PREDICT_ID, db_client=fake_client()
+        )
+
+
+def test_predict_id_is_required(fake_client):
+    with pytest.raises(ValueError, match="predict_id"):
+        PredictDataConnector(is_event_predict=True).evaluate_predicts(
+            AppsflyerRawDataConnector(), "app", "lt", 3600, db_client=fake_client()
+        )
+
+
+def test_evaluate_predicts_splits_grouping_sets(fake_client):
+    client = fake_client(
+        query_dataframe=pd.DataFrame(
+            {
+                "grouping_id": [1, 1, 2, 2, 3],
+                "install_date": [pd.Timestamp("2023-01-01"), pd.Timestamp("2023-01-02"), 0, 0, 0],
+                "bucket": [0, 0, 0, 1, 0],
+                "number_of_users": [1, 1, 1, 1, 2],
+                "mae": [0.5] * 5,
+                "rmse": [0.5] * 5,
+                "min_prediction": [0.1] * 5,
+                "max_prediction": [0.9] * 5,
+                "avg_prediction": [0.5] * 5,
+                "avg_target": [0.5] * 5,
+                "roc_auc": [1.0] * 5,
+            }
+        )
+    )
+
+    result = PredictDataConnector(is_event_predict=True).evaluate_predicts(
+        AppsflyerRawDataConnector(), "app", "lt", 3600, predict_id=PREDICT_ID, db_client=client
+    )
+
+    assert len(client.queries) == 1
+    assert "event_id = %(predict_id)s" in client.queries[0][0]
+    assert client.queries[0][1]["predict_id"] == str(PREDICT_ID)
+    assert result["overall"]["number_of_users"].tolist() == [2]
+    assert list(result["by_install_date"].index) == [pd.Timestamp("2023-01-01"), pd.Timestamp("2023-01-02")]
+    assert list(result["calibration"].index) == [0, 1]
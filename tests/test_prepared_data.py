@@ -0,0 +1,61 @@
+import re
+
+import pytest
+
+from analytics_db.prepared_data import PreparedDataConnector
+
+COLUMNS = [("user_mmp_id", "String"), ("event_number", "Int64"), ("install_time", "DateTime"), ("f1", "Float64")]
+
+
+def _normalize_whitespace(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip()
+
+
+def test_argmax_query_keeps_table_column_order(fake_client):
+    client = fake_client(execute=COLUMNS)
+    connector = PreparedDataConnector("pipeline")
+
+    query = _normalize_whitespace(
+        connector._create_dedup_select_query(
+            "db.t", connector.key_columns_eventvectors, ["install_time >= %(start_date)s"], "argmax", client
+        )
+    )
+
+    assert client.queries[0][0] == "DESCRIBE TABLE db.t"
+    assert (
+        "SELECT `user_mmp_id`, `event_number`, tupleElement(_row, 1) as `install_time`, "
+        "tupleElement(_row, 2) as `f1` FROM" in query
+    )
+    assert "argMax(tuple(`install_time`, `f1`), (_version, _row_hash)) as _row" in query
+    assert "cityHash64(`install_time`, `f1`) as _row_hash" in query
+    assert "GROUP BY `user_mmp_id`, `event_number`" in query
+    # the range is checked on the picked row, like FINAL does, not before picking it
+    assert query.endswith(") WHERE install_time >= %(start_date)s")
+    assert (
+        "WHERE (`user_mmp_id`, `event_number`) IN "
+        "(SELECT `user_mmp_id`, `event_number` FROM db.t WHERE install_time >= %(start_date)s)" in query
+    )
+
+
+@pytest.mark.parametrize("dedup, expected", [("final", "FROM db.t FINAL WHERE"), (None, "FROM db.t WHERE")])
+def test_final_and_plain_queries(fake_client, dedup, expected):
+    client = fake_client()
+    connector = PreparedDataConnector("pipeline")
+
+    query = _normalize_whitespace(
+        connector._create_dedup_select_query("db.t", ("user_mmp_id",), ["install_time >= 1"], dedup, client)
+    )
+
+    assert query == f"SELECT * {expected} install_time >= 1"
+    assert client.queries == []
+
+
+def test_argmax_counts_deduplicated_rows(fake_client):
+    client = fake_client(execute=lambda query, params: COLUMNS if query.startswith("DESCRIBE") else [[3]])
+
+    assert PreparedDataConnector("pipeline").get_number_of_events(dedup="argmax", db_client=client) == 3
+    assert PreparedDataConnector("pipeline").get_number_of_users(dedup="argmax", db_client=client) == 3
+    count_queries = [_normalize_whitespace(x[0]) for x in client.queries if not x[0].startswith("DESCRIBE")]
+    assert count_queries[0].startswith("SELECT count(1) as result FROM ( SELECT * FROM ( SELECT `user_mmp_id`")
+    assert count_queries[1].startswith("SELECT uniqExact(user_mmp_id) as result FROM ( SELECT * FROM (")
+    assert "GROUP BY `user_mmp_id`, `event_number`" in count_queries[1]
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from analytics_db.adjust import AdjustRawDataConnector
+from analytics_db.raw_data import RawDataConnector
+
+
+def test_raw_data_connector_without_spec():
+    with pytest.raises(TypeError):
+        RawDataConnector()
+
+
+def test_adjust_load_raw_data_renames_time_columns(fake_client):
+    client = fake_client(
+        query_dataframe=pd.DataFrame(
+            {
+                "adid": ["a"],
+                "installed_at": [pd.Timestamp("2023-01-01")],
+                "created_at": [pd.Timestamp("2023-01-02")],
+            }
+        )
+    )
+
+    df = AdjustRawDataConnector().load_raw_data("app", None, None, db_client=client)
+
+    assert list(df.columns) == ["adid", "install_time", "event_time", "user_mmp_id"]
+
+
+def test_load_raw_data_skips_missing_outliers_table(fake_client):
+    client = fake_client(
+        execute=[[0]], query_dataframe=pd.DataFrame({"adid": ["a"], "installed_at": [None], "created_at": [None]})
+    )
+
+    AdjustRawDataConnector().load_raw_data("app", None, None, exclude_outliers=True, db_client=client)
+
+    assert "NOT IN" not in client.queries[-1][0]
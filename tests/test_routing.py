@@ -0,0 +1,115 @@
+from types import SimpleNamespace
+
+import pytest
+from clickhouse_driver.errors import NetworkError
+
+from analytics_db import connection, routing
+from analytics_db.connection import add_db_client
+from analytics_db.routing import HostPool, parse_hosts
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(routing.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_parse_hosts():
+    assert parse_hosts("a, b:9001,,", 9000) == [("a", 9000), ("b", 9001)]
+
+
+def test_round_robin_reads(clock):
+    pool = HostPool([("a", 9000), ("b", 9000), ("c", 9000)])
+
+    assert [pool.choose_hosts()[0].host for _ in range(4)] == ["a", "b", "c", "a"]
+
+
+def test_least_loaded_reads(clock):
+    pool = HostPool([("a", 9000), ("b", 9000)], read_routing="least_loaded")
+
+    with pool.acquire(pool.hosts[0]):
+        assert pool.choose_hosts()[0].host == "b"
+    assert pool.choose_hosts()[0].host == "a"
+
+
+def test_writes_stick_to_one_host_until_it_fails(clock):
+    pool = HostPool([("a", 9000), ("b", 9000)])
+
+    assert [pool.choose_hosts(write=True)[0].host for _ in range(3)] == ["a", "a", "a"]
+
+    pool.mark_failure(pool.hosts[0])
+    assert pool.choose_hosts(write=True)[0].host == "b"
+
+    # the recovered host doesn't take writes back, so one load stays on one replica
+    clock[0] += 10
+    assert pool.choose_hosts(write=True)[0].host == "b"
+
+
+def test_failed_host_backs_off_exponentially(clock):
+    pool = HostPool([("a", 9000), ("b", 9000)], base_backoff_seconds=1.0, max_backoff_seconds=3.0)
+    host = pool.hosts[0]
+
+    for expected_backoff in (1.0, 2.0, 3.0, 3.0):
+        pool.mark_failure(host)
+        assert host.unhealthy_until == clock[0] + expected_backoff
+
+    assert not host.is_healthy
+    assert [x.host for x in pool.choose_hosts()] == ["b", "a"]
+
+    clock[0] += 3.0
+    assert host.is_healthy
+    pool.mark_success(host)
+    assert host.failures == 0
+
+
+def test_all_hosts_down_tries_the_first_to_recover(clock):
+    pool = HostPool([("a", 9000), ("b", 9000)])
+    pool.mark_failure(pool.hosts[0])
+    pool.mark_failure(pool.hosts[0])
+    pool.mark_failure(pool.hosts[1])
+
+    assert [x.host for x in pool.choose_hosts()] == ["b", "a"]
+
+
+@pytest.fixture
+def pool(monkeypatch, clock, fake_client):
+    pool = HostPool([("a", 9000), ("b", 9000)])
+    monkeypatch.setattr(connection, "_host_pool", pool)
+    monkeypatch.setattr(connection, "_create_client", lambda host, use_numpy, profile, write: fake_client(host=host))
+    return pool
+
+
+def test_read_fails_over_when_own_connection_breaks(pool):
+    @add_db_client
+    def read(db_client=None):
+        if db_client.host.host == "a":
+            db_client.disconnect()
+            raise NetworkError("connection reset")
+        return db_client.host.host
+
+    assert read() == "b"
+    assert pool.hosts[0].failures == 1
+
+
+def test_nested_network_error_does_not_blame_own_host(pool):
+    @add_db_client
+    def read(db_client=None):
+        # e.g. a shard read through its own pooled connection
+        raise NetworkError("connection reset")
+
+    with pytest.raises(NetworkError):
+        read()
+    assert [x.failures for x in pool.hosts] == [0, 0]
+
+
+@pytest.mark.parametrize("write, send_receive_timeout", [(False, 60), (True, 300)])
+def test_only_reads_get_short_timeouts_with_several_hosts(monkeypatch, write, send_receive_timeout):
+    monkeypatch.setattr(connection, "_host_pool", HostPool([("a", 9000), ("b", 9000)]))
+    # only the arguments are checked, so no real client is created
+    monkeypatch.setattr(connection, "Client", SimpleNamespace)
+
+    client = connection._create_client(connection.get_host_pool().hosts[0], False, None, write=write)
+
+    assert client.connect_timeout == 10
+    assert client.send_receive_timeout == send_receive_timeout